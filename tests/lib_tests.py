@@ -1,9 +1,26 @@
+import gc
+import io
+import logging
+import os
+import queue
+import tempfile
+import threading
 import unittest
 from datetime import datetime, timedelta
 
+from sqlalchemy import event, func, inspect, select, text, update
+
 from todolib.services import AppService
+from todolib.utils import TaskFilter, encode_cursor
 from todolib import models as mo
 from todolib import exceptions as ex
+from todolib import migrations
+from todolib import metrics
+from todolib.logging import (get_logger,
+                             describe,
+                             setup_lib_logging,
+                             stop_lib_logging,
+                             BoundedQueueHandler)
 
 DRIVER_NAME = 'sqlite'
 CONNECTIONSTRING = ':memory:'
@@ -25,6 +42,18 @@ TEST_PERIOD_VALUE = mo.Period.DAY.value
 TEST_PLAN_END_DATE = datetime.now() + timedelta(days=TEST_RANDOM_INT)
 
 
+class StatementsMixin:
+    """Collects SQL statements sent by session to database"""
+
+    def track_statements(self, session):
+        self.statements = []
+        event.listen(session.get_bind(), 'before_cursor_execute',
+                     self.count_statement)
+
+    def count_statement(self, conn, cursor, statement, *args):
+        self.statements.append(statement)
+
+
 class TaskTest(unittest.TestCase):
 
     def setUp(self):
@@ -161,6 +190,107 @@ class TaskTest(unittest.TestCase):
             self.serv.get_task(user=TEST_USER,
                                task_id=TEST_RANDOM_INT)
 
+    def test_create_tasks(self):
+        parent = self.serv.create_task(user=TEST_USER, name=TEST_NAME)
+        ids = self.serv.create_tasks(user=TEST_USER, specs=[
+            {'name': f'{TEST_NAME}{i}',
+             'priority': TEST_PRIORITY_VALUE,
+             'parent_task_id': parent.id if i % 2 else None,
+             'assigned': TEST_RECEIVER if i % 2 else None}
+            for i in range(4)])
+        tasks = self.serv.get_tasks(user=TEST_USER, task_ids=ids)
+        self.assertEqual([tasks[task_id].name for task_id in ids],
+                         [f'{TEST_NAME}{i}' for i in range(4)])
+        self.assertEqual(tasks[ids[0]].priority, TEST_PRIORITY)
+        self.assertEqual(tasks[ids[0]].status, mo.TaskStatus.TODO)
+        self.assertEqual(
+            sorted(self.serv.get_tasks(user=TEST_RECEIVER, task_ids=ids[1::2])),
+            ids[1::2])
+        self.assertEqual([task.id for task in self.serv.get_descendants(
+            user=TEST_USER, task_id=parent.id)], ids[1::2])
+
+    def test_create_tasks_validation(self):
+        task = self.serv.create_task(user=TEST_USER, name=TEST_NAME)
+        self.serv.create_plan(user=TEST_USER, task_id=task.id,
+                              period=TEST_PERIOD_VALUE,
+                              period_amount=TEST_RANDOM_INT)
+        invalid_specs = (
+            [{'name': TEST_NAME}, {'name': TEST_NAME,
+                                   'start_date': TEST_DATE_THIRD,
+                                   'end_date': TEST_DATE_FIRST}],
+            [{'name': TEST_NAME, TEST_RANDOM_STR: TEST_RANDOM_INT}],
+            [{'name': TEST_NAME, 'parent_task_id': task.id}],
+        )
+        for specs in invalid_specs:
+            with self.assertRaises(ValueError):
+                self.serv.create_tasks(user=TEST_USER, specs=specs)
+        with self.assertRaises(KeyError):
+            self.serv.create_tasks(user=TEST_USER,
+                                   specs=[{'name': TEST_NAME,
+                                           'status': TEST_RANDOM_STR}])
+        self.assertEqual(len(self.serv.get_own_tasks(user=TEST_USER)), 1)
+
+    def test_create_tasks_none_defaults(self):
+        task_id, = self.serv.create_tasks(
+            user=TEST_USER, specs=[{'name': TEST_NAME, 'status': None,
+                                    'priority': None, 'event': None}])
+        task = self.serv.get_task(user=TEST_USER, task_id=task_id)
+        self.assertEqual(task.status, mo.TaskStatus.TODO)
+        self.assertEqual(task.priority, mo.TaskPriority.LOW)
+        self.assertFalse(task.event)
+
+    def test_share_tasks(self):
+        tasks = [self.serv.create_task(user=TEST_USER, name=TEST_NAME)
+                 for _ in range(3)]
+        ids = [task.id for task in tasks]
+        self.serv.share_task(user=TEST_USER, task_id=ids[0],
+                             user_receiver=TEST_RECEIVER)
+        receivers = [TEST_RECEIVER, TEST_RANDOM_STR]
+
+        self.assertEqual(self.serv.share_tasks(user=TEST_USER, task_ids=ids,
+                                               receivers=receivers), 5)
+        for receiver in receivers:
+            self.assertEqual(sorted(self.serv.get_tasks(user=receiver,
+                                                        task_ids=ids)), ids)
+        with self.assertWarns(ex.RedundancyActionWarning):
+            self.serv.share_tasks(user=TEST_USER, task_ids=ids,
+                                  receivers=receivers)
+
+    def test_unshare_tasks(self):
+        tasks = [self.serv.create_task(user=TEST_USER, name=TEST_NAME,
+                                       assigned=TEST_RECEIVER)
+                 for _ in range(3)]
+        ids = [task.id for task in tasks]
+        with self.assertRaises(ValueError):
+            self.serv.unshare_tasks(user=TEST_USER, task_ids=ids,
+                                    receivers=[TEST_USER])
+
+        self.assertEqual(self.serv.unshare_tasks(user=TEST_USER,
+                                                 task_ids=ids[:2],
+                                                 receivers=[TEST_RECEIVER]),
+                         2)
+        self.assertIsNone(tasks[0].assigned)
+        self.assertEqual([member.user for member in tasks[0].members],
+                         [TEST_USER])
+        self.assertEqual(list(self.serv.get_tasks(user=TEST_RECEIVER,
+                                                  task_ids=ids[2:])),
+                         ids[2:])
+
+    def test_get_tasks(self):
+        tasks = [self.serv.create_task(user=TEST_USER, name=TEST_NAME)
+                 for _ in range(3)]
+        foreign = self.serv.create_task(user=TEST_RECEIVER, name=TEST_NAME)
+        ids = [task.id for task in tasks]
+        self.assertEqual(self.serv.get_tasks(user=TEST_USER, task_ids=ids),
+                         {task.id: task for task in tasks})
+        self.assertEqual(self.serv.get_tasks(user=TEST_USER, task_ids=[]), {})
+
+        with self.assertRaises(ex.ObjectNotFoundError) as context:
+            self.serv.get_tasks(user=TEST_USER,
+                                task_ids=ids + [foreign.id, TEST_RANDOM_INT])
+        self.assertIn(f'{foreign.id}, {TEST_RANDOM_INT}',
+                      str(context.exception))
+
     def test_assign_user(self):
         task = self.serv.create_task(
             user=TEST_USER,
@@ -333,6 +463,709 @@ class TaskTest(unittest.TestCase):
         self.assertEqual(len(tasks), 0)
 
 
+class TransactionTest(unittest.TestCase):
+
+    def setUp(self):
+        session = mo.set_up_connection(DRIVER_NAME, CONNECTIONSTRING)
+        self.serv = AppService(session)
+
+    def test_commit(self):
+        with self.serv.transaction():
+            task = self.serv.create_task(user=TEST_USER, name=TEST_NAME)
+            folder = self.serv.create_folder(user=TEST_USER,
+                                             name=TEST_RANDOM_STR)
+            self.serv.populate_folder(user=TEST_USER,
+                                      folder_id=folder.id,
+                                      task_id=task.id)
+            with self.serv.transaction():
+                self.serv.share_task(user=TEST_USER,
+                                     task_id=task.id,
+                                     user_receiver=TEST_RECEIVER)
+
+        self.serv.session.rollback()
+        self.assertEqual(
+            self.serv.get_task(user=TEST_RECEIVER, task_id=task.id).id,
+            task.id)
+        self.assertEqual(len(self.serv.get_folder(TEST_USER, folder.id).tasks),
+                         1)
+
+    def test_rollback(self):
+        with self.assertRaises(ValueError):
+            with self.serv.transaction():
+                task = self.serv.create_task(user=TEST_USER, name=TEST_NAME)
+                self.serv.create_task(user=TEST_USER, name=TEST_NAME,
+                                      start_date=TEST_DATE_SECOND,
+                                      end_date=TEST_DATE_FIRST)
+
+        self.assertEqual(self.serv.get_available_tasks(user=TEST_USER), [])
+
+
+class ExpireOnCommitTest(StatementsMixin, unittest.TestCase):
+
+    def setUp(self):
+        session = mo.set_up_connection(DRIVER_NAME, CONNECTIONSTRING,
+                                       expire_on_commit=False)
+        self.serv = AppService(session)
+        self.track_statements(session)
+
+    def test_create_task(self):
+        task = self.serv.create_task(user=TEST_USER, name=TEST_NAME,
+                                     assigned=TEST_RECEIVER)
+        self.statements.clear()
+        self.assertIn(TEST_RECEIVER, str(task))
+        self.assertEqual(self.statements, [])
+
+    def test_refresh(self):
+        task = self.serv.create_task(user=TEST_USER, name=TEST_NAME)
+        self.serv.session.query(mo.Task).filter_by(id=task.id).update(
+            {mo.Task.name: TEST_RANDOM_STR}, synchronize_session=False)
+        self.assertEqual(task.name, TEST_NAME)
+        self.serv.refresh(task, 'name')
+        self.assertEqual(task.name, TEST_RANDOM_STR)
+
+
+class LoadProfileTest(StatementsMixin, unittest.TestCase):
+
+    def setUp(self):
+        session = mo.set_up_connection(DRIVER_NAME, CONNECTIONSTRING)
+        self.serv = AppService(session)
+        self.session = session
+        self.track_statements(session)
+
+    def load_tasks(self, method, *args, **kwargs):
+        self.session.expunge_all()
+        self.statements.clear()
+        return method(TEST_USER, *args, **kwargs)
+
+    def test_summary(self):
+        for _ in range(TEST_RANDOM_INT // 10):
+            self.serv.create_task(user=TEST_USER, name=TEST_NAME)
+        tasks = self.load_tasks(self.serv.get_available_tasks, load='summary')
+        for task in tasks:
+            str(task)
+        self.assertEqual(len(self.statements), 2)
+
+    def test_tree(self):
+        task = self.serv.create_task(user=TEST_USER, name=TEST_NAME)
+        parent = task
+        for _ in range(3):
+            parent = self.serv.create_task(user=TEST_USER, name=TEST_NAME,
+                                           parent_task_id=parent.id)
+        root = self.load_tasks(self.serv.get_task, task.id, load='tree')
+        amount = len(self.statements)
+        while root.subtasks:
+            root.members
+            root = root.subtasks[0]
+        self.assertEqual(len(self.statements), amount)
+
+    def test_plans_detail(self):
+        task = self.serv.create_task(user=TEST_USER, name=TEST_NAME)
+        self.serv.create_plan(user=TEST_USER, task_id=task.id,
+                              period_amount=TEST_RANDOM_INT,
+                              period=TEST_PERIOD_VALUE)
+        plans = self.load_tasks(self.serv.get_all_plans, load='detail')
+        str(plans[0].task)
+        self.assertEqual(len(self.statements), 2)
+
+    def test_unknown_profile(self):
+        with self.assertRaises(KeyError):
+            self.serv.get_own_tasks(TEST_USER, load=TEST_RANDOM_STR)
+
+
+class SubtreeTest(StatementsMixin, unittest.TestCase):
+
+    def setUp(self):
+        session = mo.set_up_connection(DRIVER_NAME, CONNECTIONSTRING)
+        self.serv = AppService(session)
+        self.track_statements(session)
+        self.root = self.serv.create_task(user=TEST_USER, name=TEST_NAME)
+        self.child = self.serv.create_task(user=TEST_USER, name=TEST_NAME,
+                                           parent_task_id=self.root.id)
+        self.grandchild = self.serv.create_task(
+            user=TEST_USER, name=TEST_NAME, parent_task_id=self.child.id)
+        self.second_child = self.serv.create_task(
+            user=TEST_USER, name=TEST_NAME, parent_task_id=self.root.id)
+
+    def test_get_subtree(self):
+        subtree = self.serv.get_subtree(user=TEST_USER, task_id=self.root.id)
+        self.assertEqual([(task.id, depth) for task, depth in subtree],
+                         [(self.root.id, 0),
+                          (self.child.id, 1),
+                          (self.grandchild.id, 2),
+                          (self.second_child.id, 1)])
+
+    def test_change_subtree_status(self):
+        self.statements.clear()
+        self.serv.change_task_status(user=TEST_USER,
+                                     task_id=self.root.id,
+                                     status=mo.TaskStatus.DONE.value)
+        updates = [statement for statement in self.statements
+                   if 'UPDATE' in statement]
+        self.assertEqual(len(updates), 2)
+        for task in (self.child, self.grandchild, self.second_child):
+            self.assertEqual(task.status, mo.TaskStatus.DONE)
+
+    def test_inaccessible_subtasks_skipped(self):
+        self.serv.share_task(user=TEST_USER, task_id=self.root.id,
+                             user_receiver=TEST_RECEIVER)
+        foreign = self.serv.create_task(user=TEST_RECEIVER, name=TEST_NAME,
+                                        parent_task_id=self.root.id)
+        subtree = self.serv.get_subtree(user=TEST_USER, task_id=self.root.id)
+        self.assertNotIn(foreign.id, [task.id for task, depth in subtree])
+
+        self.serv.change_task_status(user=TEST_USER,
+                                     task_id=self.root.id,
+                                     status=mo.TaskStatus.DONE.value)
+        self.assertEqual(foreign.status, mo.TaskStatus.TODO)
+
+    def test_looped_hierarchy(self):
+        self.serv.session.execute(
+            update(mo.Task).where(mo.Task.id == self.root.id)
+            .values(parent_task_id=self.grandchild.id))
+        self.serv.session.expire_all()
+
+        subtree = self.serv.get_subtree(user=TEST_USER, task_id=self.root.id)
+        self.assertEqual(sorted(task.id for task, depth in subtree),
+                         sorted([self.root.id, self.child.id,
+                                 self.grandchild.id, self.second_child.id]))
+        self.serv.change_task_status(user=TEST_USER,
+                                     task_id=self.root.id,
+                                     status=mo.TaskStatus.DONE.value)
+        self.assertEqual(self.grandchild.status, mo.TaskStatus.DONE)
+
+        self.serv.delete_task(user=TEST_USER, task_id=self.root.id,
+                              recursive=True)
+        self.assertEqual(self.serv.session.execute(
+            select(func.count()).select_from(mo.Task)).scalar(), 0)
+
+
+class ClosureTest(unittest.TestCase):
+
+    def setUp(self):
+        session = mo.set_up_connection(DRIVER_NAME, CONNECTIONSTRING)
+        self.serv = AppService(session)
+        self.chain = [self.serv.create_task(user=TEST_USER, name=TEST_NAME)]
+        for _ in range(4):
+            self.chain.append(self.serv.create_task(
+                user=TEST_USER, name=TEST_NAME,
+                parent_task_id=self.chain[-1].id))
+
+    def test_is_ancestor(self):
+        self.assertTrue(self.serv.is_ancestor(self.chain[0].id,
+                                              self.chain[-1].id))
+        self.assertFalse(self.serv.is_ancestor(self.chain[-1].id,
+                                               self.chain[0].id))
+
+    def test_get_descendants(self):
+        descendants = self.serv.get_descendants(user=TEST_USER,
+                                                task_id=self.chain[0].id)
+        self.assertEqual([task.id for task in descendants],
+                         [task.id for task in self.chain[1:]])
+        descendants = self.serv.get_descendants(user=TEST_USER,
+                                                task_id=self.chain[0].id,
+                                                max_depth=2)
+        self.assertEqual([task.id for task in descendants],
+                         [task.id for task in self.chain[1:3]])
+
+    def test_get_ancestors(self):
+        ancestors = self.serv.get_ancestors(user=TEST_USER,
+                                            task_id=self.chain[-1].id)
+        self.assertEqual([task.id for task in ancestors],
+                         [task.id for task in reversed(self.chain[:-1])])
+
+    def test_deep_loop_dependency(self):
+        self.serv.detach_task(user=TEST_USER, task_id=self.chain[1].id)
+        self.serv.add_subtask(user=TEST_USER, task_id=self.chain[0].id,
+                              parent_task_id=self.chain[-1].id)
+        self.assertTrue(self.serv.is_ancestor(self.chain[1].id,
+                                              self.chain[0].id))
+        with self.assertRaises(ValueError):
+            self.serv.add_subtask(user=TEST_USER, task_id=self.chain[1].id,
+                                  parent_task_id=self.chain[0].id)
+
+    def test_detach_and_delete(self):
+        self.serv.detach_task(user=TEST_USER, task_id=self.chain[2].id)
+        self.assertFalse(self.serv.is_ancestor(self.chain[0].id,
+                                               self.chain[-1].id))
+        self.assertTrue(self.serv.is_ancestor(self.chain[2].id,
+                                              self.chain[-1].id))
+        self.serv.delete_task(user=TEST_USER, task_id=self.chain[3].id)
+        self.assertFalse(self.serv.is_ancestor(self.chain[2].id,
+                                               self.chain[-1].id))
+
+
+class DeleteTaskTest(StatementsMixin, unittest.TestCase):
+
+    def setUp(self):
+        self.session = mo.set_up_connection(DRIVER_NAME, CONNECTIONSTRING,
+                                            pragma_profile='default')
+        self.serv = AppService(self.session)
+        self.root = self.serv.create_task(user=TEST_USER, name=TEST_NAME)
+        self.child = self.serv.create_task(user=TEST_USER, name=TEST_NAME,
+                                           parent_task_id=self.root.id)
+        self.grandchild = self.serv.create_task(
+            user=TEST_USER, name=TEST_NAME, parent_task_id=self.child.id)
+        self.ids = [self.root.id, self.child.id, self.grandchild.id]
+        self.folder = self.serv.create_folder(user=TEST_USER, name=TEST_NAME)
+        for task_id in self.ids:
+            self.serv.share_task(user=TEST_USER, task_id=task_id,
+                                 user_receiver=TEST_RECEIVER)
+            self.serv.populate_folder(user=TEST_USER,
+                                      folder_id=self.folder.id,
+                                      task_id=task_id)
+            self.serv.create_reminder(user=TEST_USER, task_id=task_id,
+                                      date=TEST_DATE_THIRD)
+        self.serv.create_plan(user=TEST_USER, task_id=self.grandchild.id,
+                              period=TEST_PERIOD_VALUE,
+                              period_amount=TEST_RANDOM_INT)
+
+    def count(self, table):
+        return self.session.execute(
+            select(func.count()).select_from(table)).scalar()
+
+    def test_delete_recursive(self):
+        self.serv.delete_task(user=TEST_USER, task_id=self.root.id,
+                              recursive=True)
+        for table in (mo.Task.__table__, mo.TaskUserRelation.__table__,
+                      mo.TaskClosure.__table__, mo.Plan.__table__,
+                      mo.Reminder.__table__,
+                      mo.task_folder_association_table):
+            self.assertEqual(self.count(table), 0)
+        self.assertEqual(self.folder.tasks, [])
+
+    def test_subtasks_kept(self):
+        self.serv.delete_task(user=TEST_USER, task_id=self.child.id)
+        self.assertIsNone(self.grandchild.parent_task_id)
+        self.assertFalse(self.serv.is_ancestor(self.root.id,
+                                               self.grandchild.id))
+        self.assertEqual([task.id for task in self.folder.tasks],
+                         [self.root.id, self.grandchild.id])
+        self.assertEqual(self.count(mo.Reminder.__table__), 2)
+
+    def test_many_subtasks_kept(self):
+        for _ in range(20):
+            self.serv.create_task(user=TEST_USER, name=TEST_NAME,
+                                  parent_task_id=self.child.id)
+        self.track_statements(self.session)
+        self.serv.delete_task(user=TEST_USER, task_id=self.child.id)
+
+        closure_deletes = [statement for statement in self.statements
+                           if statement.startswith('DELETE FROM task_closure')]
+        self.assertEqual(len(closure_deletes), 2)
+        self.assertEqual(self.count(mo.TaskClosure.__table__), 22)
+        self.assertEqual(self.serv.get_descendants(user=TEST_USER,
+                                                   task_id=self.root.id), [])
+
+    def test_database_cascades(self):
+        self.session.execute(mo.Task.__table__.delete().where(
+            mo.Task.id == self.child.id))
+        self.assertEqual(self.count(mo.TaskUserRelation.__table__), 4)
+        self.assertEqual(self.count(mo.task_folder_association_table), 2)
+        self.assertIsNone(self.session.execute(
+            select(mo.Task.parent_task_id)
+            .where(mo.Task.id == self.grandchild.id)).scalar())
+
+
+class StatsTest(unittest.TestCase):
+
+    def setUp(self):
+        session = mo.set_up_connection(DRIVER_NAME, CONNECTIONSTRING)
+        self.serv = AppService(session)
+        self.folder = self.serv.create_folder(user=TEST_USER, name=TEST_NAME)
+        self.overdue = self.serv.create_task(user=TEST_USER, name=TEST_NAME,
+                                             priority=TEST_PRIORITY_VALUE,
+                                             end_date=TEST_DATE_THIRD)
+        self.done = self.serv.create_task(user=TEST_USER, name=TEST_NAME,
+                                          end_date=TEST_DATE_THIRD)
+        self.serv.change_task_status(user=TEST_USER, task_id=self.done.id,
+                                     status=mo.TaskStatus.DONE.value)
+        self.serv.populate_folder(user=TEST_USER, folder_id=self.folder.id,
+                                  task_id=self.done.id)
+        self.serv.create_task(user=TEST_RECEIVER, name=TEST_NAME)
+        self.now = TEST_DATE_THIRD + timedelta(days=1)
+
+    def test_group_by_status(self):
+        stats = self.serv.task_stats(user=TEST_USER, now=self.now)
+        self.assertEqual(stats, {mo.TaskStatus.TODO: (1, 1),
+                                 mo.TaskStatus.DONE: (1, 0)})
+
+    def test_group_by_several_columns(self):
+        stats = self.serv.task_stats(user=TEST_USER,
+                                     group_by=('priority', 'folder'),
+                                     now=self.now)
+        self.assertEqual(stats, {(TEST_PRIORITY, None): (1, 1),
+                                 (mo.TaskPriority.LOW, self.folder.id): (1, 0)})
+
+    def test_total(self):
+        folder = self.serv.create_folder(user=TEST_USER,
+                                         name=TEST_RANDOM_STR)
+        self.serv.populate_folder(user=TEST_USER, folder_id=folder.id,
+                                  task_id=self.done.id)
+        stats = self.serv.task_stats(user=TEST_USER, group_by=(),
+                                     now=self.now)
+        self.assertEqual(stats, {(): (2, 1)})
+        self.assertEqual(self.serv.task_stats(user=TEST_RANDOM_STR,
+                                              group_by=()), {(): (0, 0)})
+
+    def test_filters(self):
+        stats = self.serv.task_stats(user=TEST_USER,
+                                     group_by='assigned',
+                                     priority=TEST_PRIORITY_VALUE)
+        self.assertEqual(stats, {None: (1, 0)})
+
+    def test_unknown_group(self):
+        with self.assertRaises(KeyError):
+            self.serv.task_stats(user=TEST_USER, group_by=TEST_RANDOM_STR)
+
+
+class SearchTest(unittest.TestCase):
+
+    def setUp(self):
+        session = mo.set_up_connection(DRIVER_NAME, CONNECTIONSTRING)
+        self.serv = AppService(session)
+        self.report = self.serv.create_task(user=TEST_USER,
+                                            name='Make a report',
+                                            description='weekly report')
+        self.bugs = self.serv.create_task(user=TEST_USER,
+                                          name='Report bugs')
+        self.serv.create_task(user=TEST_RECEIVER, name='Report secrets')
+
+    def search(self, query):
+        return [task.id for task in self.serv.search_tasks(TEST_USER, query)]
+
+    def test_prefix_search(self):
+        self.assertEqual(sorted(self.search('rep')),
+                         [self.report.id, self.bugs.id])
+        self.assertEqual(self.search('rep bug'), [self.bugs.id])
+
+    def test_phrase_search(self):
+        self.assertEqual(self.search('"weekly report"'), [self.report.id])
+        self.assertEqual(self.search('"report weekly"'), [])
+        self.assertEqual(self.search('"'), [])
+
+    def test_index_synchronized(self):
+        self.serv.update_task(user=TEST_USER, task_id=self.bugs.id,
+                              name=TEST_NAME)
+        self.assertEqual(self.search('bugs'), [])
+        self.assertEqual(self.search(TEST_NAME), [self.bugs.id])
+        self.serv.delete_task(user=TEST_USER, task_id=self.bugs.id)
+        self.assertEqual(self.search(TEST_NAME), [])
+
+    def test_filters(self):
+        tasks = self.serv.get_filtered_tasks(user=TEST_USER,
+                                             description='week')
+        self.assertEqual([task.id for task in tasks], [self.report.id])
+        tasks = self.serv.get_tasks_by_name(user=TEST_USER, name='bug')
+        self.assertEqual([task.id for task in tasks], [self.bugs.id])
+
+
+class PaginationTest(unittest.TestCase):
+
+    def setUp(self):
+        session = mo.set_up_connection(DRIVER_NAME, CONNECTIONSTRING)
+        self.serv = AppService(session)
+        self.tasks = [self.serv.create_task(user=TEST_USER,
+                                            name=f'{TEST_NAME}{i}',
+                                            end_date=TEST_DATE_THIRD + timedelta(days=i % 3)
+                                            if i % 4 else None)
+                      for i in range(10)]
+
+    def walk(self, method, limit, **kwargs):
+        ids = []
+        cursor = None
+        while True:
+            page = method(TEST_USER, limit=limit, after=cursor, **kwargs)
+            self.assertTrue(len(page.items) <= limit)
+            ids.extend(item.id for item in page.items)
+            cursor = page.cursor
+            if cursor is None:
+                return ids
+
+    def test_pages_by_id(self):
+        ids = self.walk(self.serv.list_tasks, 3)
+        self.assertEqual(ids, [task.id for task in self.tasks])
+
+    def test_pages_by_nullable_column(self):
+        ids = self.walk(self.serv.list_tasks, 3, order_by='end_date')
+        expected = sorted(self.tasks,
+                          key=lambda task: (task.end_date is None,
+                                            task.end_date or datetime.min,
+                                            task.id))
+        self.assertEqual(ids, [task.id for task in expected])
+
+    def test_filtered_pages(self):
+        self.serv.change_task_status(user=TEST_USER,
+                                     task_id=self.tasks[0].id,
+                                     status=TEST_STATUS_VALUE)
+        page = self.serv.list_tasks(TEST_USER, status=TEST_STATUS)
+        self.assertEqual([task.id for task in page.items], [self.tasks[0].id])
+        self.assertIsNone(page.cursor)
+
+    def test_reminders_pages(self):
+        for task in self.tasks:
+            self.serv.create_reminder(user=TEST_USER, task_id=task.id,
+                                      date=TEST_DATE_THIRD)
+        ids = self.walk(self.serv.list_reminders, 4, order_by='date')
+        self.assertEqual(len(set(ids)), len(self.tasks))
+
+    def test_pages_walk_indexes(self):
+        plan_task = self.serv.create_task(user=TEST_USER, name=TEST_NAME)
+        self.serv.create_plan(user=TEST_USER, task_id=plan_task.id,
+                              period=TEST_PERIOD_VALUE,
+                              period_amount=TEST_RANDOM_INT)
+        for task in self.tasks:
+            self.serv.create_reminder(user=TEST_USER, task_id=task.id,
+                                      date=TEST_DATE_THIRD)
+        statements = []
+        event.listen(self.serv.session.get_bind(), 'before_cursor_execute',
+                     lambda conn, cursor, statement, parameters, *args:
+                     statements.append((statement, parameters)))
+        self.walk(self.serv.list_tasks, 3)
+        self.walk(self.serv.list_tasks, 3, order_by='end_date')
+        self.walk(self.serv.list_reminders, 3)
+        self.walk(self.serv.list_reminders, 3, order_by='date')
+        self.walk(self.serv.list_plans, 3)
+
+        pages = [(statement, parameters) for statement, parameters
+                 in statements if statement.startswith('SELECT')]
+        connection = self.serv.session.connection()
+        for statement, parameters in pages:
+            plan = connection.exec_driver_sql(
+                f'EXPLAIN QUERY PLAN {statement}', parameters).fetchall()
+            self.assertFalse([row for row in plan if 'TEMP B-TREE' in row[3]],
+                             statement)
+
+    def test_iter_tasks(self):
+        expected = [task.id for task in self.tasks]
+        self.serv.session.expunge_all()
+        ids = [task.id for task in self.serv.iter_tasks(TEST_USER,
+                                                        batch_size=3)]
+        self.assertEqual(ids, expected)
+        self.assertEqual(len(self.serv.session.identity_map), 0)
+
+    def test_iter_tasks_columns(self):
+        rows = list(self.serv.iter_tasks(TEST_USER,
+                                         columns=['id', 'name'],
+                                         name=f'{TEST_NAME}1'))
+        self.assertEqual(rows, [(self.tasks[1].id, self.tasks[1].name)])
+        with self.assertRaises(KeyError):
+            list(self.serv.iter_tasks(TEST_USER, columns=[TEST_RANDOM_STR]))
+
+    def test_pages_of_rows(self):
+        expected = self.walk(self.serv.list_tasks, 3, order_by='end_date')
+        self.serv.session.expunge_all()
+        ids = self.walk(self.serv.list_tasks, 3, order_by='end_date',
+                        columns=['name'])
+        self.assertEqual(ids, expected)
+        self.assertEqual(len(self.serv.session.identity_map), 0)
+
+        page = self.serv.list_tasks(TEST_USER, limit=1, columns='list')
+        self.assertEqual(page.items[0]._fields, ('id', 'name', 'start_date',
+                                                 'end_date', 'status',
+                                                 'priority'))
+        self.assertEqual(page.items[0].status, mo.TaskStatus.TODO)
+        with self.assertRaises(KeyError):
+            self.serv.list_tasks(TEST_USER, columns=TEST_RANDOM_STR)
+
+    def test_invalid_cursor(self):
+        page = self.serv.list_tasks(TEST_USER, limit=1)
+        with self.assertRaises(ValueError):
+            self.serv.list_tasks(TEST_USER, after=TEST_RANDOM_STR)
+        with self.assertRaises(ValueError):
+            self.serv.list_tasks(TEST_USER, after=page.cursor,
+                                 order_by='end_date')
+        with self.assertRaises(KeyError):
+            self.serv.list_tasks(TEST_USER, order_by=TEST_RANDOM_STR)
+        with self.assertRaises(KeyError):
+            self.serv.list_tasks(TEST_USER, order_by='name')
+
+    def test_tampered_cursor(self):
+        for order_by, value, id in (('end_date', TEST_RANDOM_INT, 1),
+                                    ('end_date', TEST_RANDOM_STR, 1),
+                                    ('id', None, TEST_RANDOM_STR),
+                                    ('end_date', [], 1)):
+            cursor = encode_cursor(order_by, value, id)
+            with self.assertRaises(ValueError):
+                self.serv.list_tasks(TEST_USER, after=cursor,
+                                     order_by=order_by)
+
+
+class LoggingTest(StatementsMixin, unittest.TestCase):
+
+    def setUp(self):
+        session = mo.set_up_connection(DRIVER_NAME, CONNECTIONSTRING)
+        self.serv = AppService(session)
+        self.track_statements(session)
+
+        self.stream = io.StringIO()
+        self.handler = logging.StreamHandler(self.stream)
+        self.logger = get_logger()
+        self.level = self.logger.level
+        self.logger.addHandler(self.handler)
+        self.logger.setLevel(logging.DEBUG)
+
+    def tearDown(self):
+        self.logger.removeHandler(self.handler)
+        self.logger.setLevel(self.level)
+
+    def test_no_loads_on_logging(self):
+        task = self.serv.create_task(user=TEST_USER, name=TEST_NAME)
+        task_id = task.id
+        self.statements.clear()
+        self.serv.get_task(user=TEST_USER, task_id=task_id)
+        self.assertEqual(len(self.statements), 1)
+        self.assertIn(f'Task(id={task_id})', self.stream.getvalue())
+
+    def test_describe(self):
+        self.assertEqual(describe(list(range(3))), '[0, 1, 2]')
+        self.assertEqual(describe(list(range(100))),
+                         '[0, 1, 2, 3, 4, ... 95 more]')
+        self.assertEqual(describe({'user': TEST_USER}), "{user: 'user'}")
+        self.assertEqual(describe(mo.Task(name=TEST_NAME, owner=TEST_USER)),
+                         'Task(pending)')
+        self.assertTrue(len(describe('x' * 1000)) < 300)
+
+
+class AsyncLoggingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'test.log')
+        self.logger = get_logger()
+        self.level = self.logger.level
+
+    def tearDown(self):
+        stop_lib_logging()
+        self.logger.handlers.clear()
+        self.logger.setLevel(self.level)
+        self.dir.cleanup()
+
+    def test_async_logging(self):
+        setup_lib_logging(log_file_path=self.path,
+                          log_level='INFO',
+                          async_logging=True,
+                          max_bytes=1024,
+                          backup_count=2,
+                          compress=True)
+        self.assertIsInstance(self.logger.handlers[0], BoundedQueueHandler)
+        for i in range(100):
+            self.logger.info(TEST_RANDOM_STR * 5)
+        stop_lib_logging()
+
+        files = sorted(os.listdir(self.dir.name))
+        self.assertEqual(files, ['test.log', 'test.log.1.gz', 'test.log.2.gz'])
+        with open(self.path) as log_file:
+            self.assertIn(TEST_RANDOM_STR, log_file.read())
+
+    def test_drop_policy(self):
+        handler = BoundedQueueHandler(queue.Queue(1))
+        record = logging.makeLogRecord({'msg': TEST_RANDOM_STR})
+        handler.handle(record)
+        handler.handle(record)
+        self.assertEqual(handler.dropped, 1)
+
+
+class MetricsTest(unittest.TestCase):
+
+    def setUp(self):
+        session = mo.set_up_connection(DRIVER_NAME, CONNECTIONSTRING)
+        self.serv = AppService(session)
+        metrics.reset()
+
+    def test_calls_recorded(self):
+        task = self.serv.create_task(user=TEST_USER, name=TEST_NAME)
+        for _ in range(3):
+            self.serv.get_task(user=TEST_USER, task_id=task.id)
+        with self.assertRaises(ex.LibError):
+            self.serv.get_task(user=TEST_USER, task_id=TEST_RANDOM_INT)
+
+        stats = metrics.snapshot()['AppService.get_task']
+        self.assertEqual(stats['calls'], 4)
+        self.assertEqual(stats['errors'], 1)
+        self.assertTrue(0 < stats['p50'] <= stats['p99'] <= stats['max'])
+
+    def test_threads_merged(self):
+        def record():
+            for _ in range(TEST_RANDOM_INT):
+                metrics.registry.record(TEST_NAME, 0.001)
+
+        threads = [threading.Thread(target=record) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(metrics.snapshot()[TEST_NAME]['calls'],
+                         4 * TEST_RANDOM_INT)
+
+    def test_finished_threads_folded(self):
+        registry = metrics.MetricsRegistry()
+
+        def record():
+            registry.record(TEST_NAME, 0.001)
+
+        for _ in range(TEST_RANDOM_INT):
+            thread = threading.Thread(target=record)
+            thread.start()
+            thread.join()
+        gc.collect()
+        self.assertEqual(registry.snapshot()[TEST_NAME]['calls'],
+                         TEST_RANDOM_INT)
+        self.assertEqual(registry._shards, [])
+
+    def test_percentiles(self):
+        stats = metrics.MethodStats()
+        for _ in range(99):
+            stats.add(0.0001)
+        stats.add(1)
+        self.assertTrue(stats.percentile(0.5) < 0.001)
+        self.assertEqual(stats.percentile(1), 1)
+
+    def test_queries_attributed(self):
+        session = mo.set_up_connection(DRIVER_NAME, CONNECTIONSTRING,
+                                       track_queries=True)
+        self.addCleanup(setattr, metrics.registry, 'track_queries', False)
+        serv = AppService(session)
+        for _ in range(metrics.N_PLUS_ONE_THRESHOLD):
+            serv.create_task(user=TEST_USER, name=TEST_NAME)
+        session.expire_all()
+        stats = metrics.snapshot()['AppService.create_task']
+        self.assertTrue(stats['statements'] > 0)
+        self.assertEqual(stats['n_plus_one'], 0)
+
+        with metrics.query_scope(TEST_NAME) as scope:
+            for task in serv.get_own_tasks(TEST_USER):
+                task.members
+        self.assertTrue(scope.statements > metrics.N_PLUS_ONE_THRESHOLD)
+        self.assertEqual(metrics.snapshot()[TEST_NAME]['n_plus_one'], 1)
+
+    def test_nested_scopes(self):
+        session = mo.set_up_connection(DRIVER_NAME, CONNECTIONSTRING,
+                                       track_queries=True)
+        self.addCleanup(setattr, metrics.registry, 'track_queries', False)
+        serv = AppService(session)
+        task_id = serv.create_task(user=TEST_USER, name=TEST_NAME).id
+        session.expire_all()
+        metrics.reset()
+
+        with metrics.query_scope(TEST_NAME) as scope:
+            serv.get_task(user=TEST_USER, task_id=task_id)
+            serv.get_all_folders(user=TEST_USER)
+        stats = metrics.snapshot()
+        calls = (stats['AppService.get_task']['statements'] +
+                 stats['AppService.get_all_folders']['statements'])
+        self.assertTrue(stats['AppService.get_task']['statements'] > 0)
+        self.assertEqual(scope.statements, calls)
+        self.assertEqual(stats[TEST_NAME]['statements'], calls)
+
+    def test_disabled(self):
+        metrics.disable()
+        try:
+            self.serv.create_task(user=TEST_USER, name=TEST_NAME)
+        finally:
+            metrics.enable()
+        self.assertNotIn('AppService.create_task', metrics.snapshot())
+
+
 class FolderTest(unittest.TestCase):
 
     def setUp(self):
@@ -397,8 +1230,141 @@ class FolderTest(unittest.TestCase):
                                         folder_id=folder.id,
                                         task_id=task.id)
 
+    def test_membership_statements(self):
+        folder = self.serv.create_folder(user=TEST_USER, name='rand')
+        task = self.serv.create_task(user=TEST_USER, name=TEST_NAME)
+        self.serv.populate_folder(user=TEST_USER, folder_id=folder.id,
+                                  task_id=task.id)
+        self.assertEqual(folder.tasks, [task])
+        with self.assertWarns(ex.RedundancyActionWarning):
+            self.serv.populate_folder(user=TEST_USER, folder_id=folder.id,
+                                      task_id=task.id)
+
+        self.serv.delete_folder(user=TEST_USER, folder_id=folder.id)
+        self.assertEqual(self.serv.session.execute(
+            select(func.count()).select_from(
+                mo.task_folder_association_table)).scalar(), 0)
+        self.assertEqual(len(self.serv.get_all_folders(user=TEST_USER)), 0)
+
+    def test_move_tasks(self):
+        source = self.serv.create_folder(user=TEST_USER, name='source')
+        target = self.serv.create_folder(user=TEST_USER, name='target')
+        tasks = [self.serv.create_task(user=TEST_USER, name=TEST_NAME)
+                 for _ in range(3)]
+        for task in tasks:
+            self.serv.populate_folder(user=TEST_USER, folder_id=source.id,
+                                      task_id=task.id)
+        self.serv.populate_folder(user=TEST_USER, folder_id=target.id,
+                                  task_id=tasks[0].id)
+
+        moved = self.serv.move_tasks(user=TEST_USER,
+                                     task_ids=[tasks[0].id, tasks[1].id],
+                                     from_folder_id=source.id,
+                                     to_folder_id=target.id)
+        self.assertEqual(moved, 2)
+        self.assertEqual(source.tasks, [tasks[2]])
+        self.assertEqual(sorted(task.id for task in target.tasks),
+                         [tasks[0].id, tasks[1].id])
+
+        with self.assertRaises(ValueError):
+            self.serv.move_tasks(user=TEST_USER, task_ids=[tasks[0].id],
+                                 from_folder_id=source.id,
+                                 to_folder_id=target.id)
+        with self.assertWarns(ex.RedundancyActionWarning):
+            self.serv.move_tasks(user=TEST_USER, task_ids=[tasks[2].id],
+                                 from_folder_id=source.id,
+                                 to_folder_id=source.id)
+        with self.assertRaises(ex.ObjectNotFoundError):
+            self.serv.move_tasks(user=TEST_RECEIVER, task_ids=[tasks[2].id],
+                                 from_folder_id=source.id,
+                                 to_folder_id=target.id)
+
 
-class PlanTest(unittest.TestCase):
+class TaskFilterTest(unittest.TestCase):
+
+    def setUp(self):
+        session = mo.set_up_connection(DRIVER_NAME, CONNECTIONSTRING)
+        self.serv = AppService(session)
+        self.low = self.serv.create_task(user=TEST_USER, name='low',
+                                         end_date=TEST_DATE_THIRD)
+        self.high = self.serv.create_task(user=TEST_USER, name='high',
+                                          priority=TEST_PRIORITY_VALUE,
+                                          status=TEST_STATUS_VALUE)
+        self.archived = self.serv.create_task(user=TEST_USER,
+                                              name='archived',
+                                              status='archived',
+                                              parent_task_id=self.low.id,
+                                              assigned=TEST_RECEIVER)
+        self.folder = self.serv.create_folder(user=TEST_USER,
+                                              name=TEST_NAME)
+        self.serv.populate_folder(user=TEST_USER, folder_id=self.folder.id,
+                                  task_id=self.high.id)
+
+    def ids(self, **params):
+        return [task.id for task in
+                self.serv.filter_tasks(user=TEST_USER,
+                                       task_filter=TaskFilter(**params))]
+
+    def test_conditions(self):
+        archived = mo.TaskStatus.ARCHIVED
+        self.assertEqual(self.ids(status__ne=archived),
+                         [self.low.id, self.high.id])
+        self.assertEqual(self.ids(status__not_in=['archived', 'inwork']),
+                         [self.low.id])
+        self.assertEqual(self.ids(priority__in=[TEST_PRIORITY]),
+                         [self.high.id])
+        self.assertEqual(self.ids(parent_task_id__isnull=False),
+                         [self.archived.id])
+        self.assertEqual(self.ids(end_date__gte=TEST_DATE_THIRD),
+                         [self.low.id])
+        self.assertEqual(self.ids(assigned__ne=TEST_RECEIVER),
+                         [self.low.id, self.high.id])
+        self.assertEqual(self.ids(folder=self.folder.id), [self.high.id])
+        self.assertEqual(self.ids(folder__isnull=True),
+                         [self.low.id, self.archived.id])
+        self.assertEqual(self.ids(folder__not_in=[self.folder.id],
+                                  name='low'), [self.low.id])
+
+        with self.assertRaises(KeyError):
+            self.ids(plan=None)
+        with self.assertRaises(KeyError):
+            self.ids(name__like='low')
+        with self.assertRaises(KeyError):
+            self.ids(folder__lt=self.folder.id)
+
+    def test_order_and_limit(self):
+        self.assertEqual(self.ids(order_by=('-priority', 'name')),
+                         [self.high.id, self.archived.id, self.low.id])
+        self.assertEqual(self.ids(order_by='end_date', limit=1),
+                         [self.low.id])
+        self.assertEqual(self.ids(order_by='-status', limit=2),
+                         [self.archived.id, self.high.id])
+        with self.assertRaises(KeyError):
+            self.ids(order_by='owner')
+        with self.assertRaises(ValueError):
+            TaskFilter(limit=0)
+
+    def test_combined_filter(self):
+        active = TaskFilter(status__ne=mo.TaskStatus.ARCHIVED)
+        task_filter = active & TaskFilter(order_by='-id', limit=1)
+        tasks = self.serv.filter_tasks(user=TEST_USER,
+                                       task_filter=task_filter,
+                                       columns='list')
+        self.assertEqual([row.id for row in tasks], [self.high.id])
+        self.assertEqual(self.serv.filter_tasks(user=TEST_RECEIVER,
+                                                task_filter=active), [])
+
+        page = self.serv.list_tasks(user=TEST_USER, limit=1,
+                                    task_filter=active)
+        self.assertEqual([task.id for task in page.items], [self.low.id])
+        page = self.serv.list_tasks(user=TEST_USER, after=page.cursor,
+                                    task_filter=active)
+        self.assertEqual([task.id for task in page.items], [self.high.id])
+        with self.assertRaises(ValueError):
+            self.serv.list_tasks(user=TEST_USER, task_filter=task_filter)
+
+
+class PlanTest(StatementsMixin, unittest.TestCase):
 
     def setUp(self):
         session = mo.set_up_connection(DRIVER_NAME, CONNECTIONSTRING)
@@ -523,6 +1489,37 @@ class PlanTest(unittest.TestCase):
         res += plan3.repetitions_counter + 3
         self.assertTrue(len, res)
 
+    def test_get_generated_tasks_by_plans(self):
+        plans, generated = [], {}
+        for _ in range(2):
+            task = self.serv.create_task(user=TEST_USER, name=TEST_NAME,
+                                         start_date=TEST_DATE_FIRST)
+            plan = self.serv.create_plan(user=TEST_USER, task_id=task.id,
+                                         period_amount=TEST_RANDOM_INT,
+                                         period=TEST_PERIOD_VALUE)
+            subtasks = [self.serv.create_task(user=TEST_USER,
+                                              name=TEST_NAME).id
+                        for _ in range(2)]
+            self.serv.session.execute(
+                update(mo.Task).where(mo.Task.id.in_(subtasks))
+                .values(parent_task_id=task.id))
+            plans.append(plan)
+            generated[plan.id] = subtasks
+        self.serv.session.expire_all()
+        plans = self.serv.list_plans(user=TEST_USER).items
+
+        self.track_statements(self.serv.session)
+        tasks = self.serv.get_generated_tasks_by_plans(user=TEST_USER,
+                                                       plans=plans,
+                                                       load='summary')
+        self.assertEqual({plan_id: [task.id for task in plan_tasks]
+                          for plan_id, plan_tasks in tasks.items()},
+                         generated)
+        for plan_tasks in tasks.values():
+            for task in plan_tasks:
+                self.assertEqual(len(task.members), 1)
+        self.assertEqual(len(self.statements), 2)
+
 
 class ReminderTest(unittest.TestCase):
 
@@ -567,3 +1564,133 @@ class ReminderTest(unittest.TestCase):
             reminder = self.serv.update_reminder(user=TEST_USER,
                                                  reminder_id=self.reminder.id,
                                                  date=TEST_DATE_FIRST)
+
+
+class ConnectionRegistryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = mo.ConnectionRegistry()
+
+    def tearDown(self):
+        self.registry.dispose()
+
+    def test_get_engine(self):
+        engine = self.registry.get_engine(DRIVER_NAME, CONNECTIONSTRING)
+        self.assertIs(engine,
+                      self.registry.get_engine(DRIVER_NAME, CONNECTIONSTRING))
+
+    def test_get_session(self):
+        session = self.registry.get_session(DRIVER_NAME, CONNECTIONSTRING)
+        self.assertIs(session,
+                      self.registry.get_session(DRIVER_NAME, CONNECTIONSTRING))
+
+        serv = AppService(session)
+        task = serv.create_task(user=TEST_USER, name=TEST_NAME)
+        serv = AppService(
+            self.registry.get_session(DRIVER_NAME, CONNECTIONSTRING))
+        self.assertEqual(serv.get_task(user=TEST_USER, task_id=task.id), task)
+
+        self.registry.remove_sessions()
+        serv = AppService(
+            self.registry.get_session(DRIVER_NAME, CONNECTIONSTRING))
+        self.assertEqual(serv.get_task(user=TEST_USER, task_id=task.id).id,
+                         task.id)
+
+
+class SchemaTest(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = mo.create_lib_engine(DRIVER_NAME, CONNECTIONSTRING)
+
+    def test_check_schema(self):
+        mo.check_schema(self.engine)
+        with self.engine.connect() as connection:
+            self.assertEqual(mo.get_schema_version(connection),
+                             mo.SCHEMA_VERSION)
+        mo.check_schema(self.engine)
+
+    def test_upgrade(self):
+        mo.BaseModel.metadata.create_all(self.engine)
+        with self.engine.begin() as connection:
+            mo.SchemaVersion.__table__.drop(connection)
+            for trigger in ('insert', 'update', 'delete'):
+                connection.execute(text(f'DROP TRIGGER tasks_fts_{trigger}'))
+            connection.execute(text('DROP TABLE tasks_fts'))
+            connection.execute(mo.Task.__table__.insert(),
+                               [{'name': TEST_NAME, 'owner': TEST_USER,
+                                 'parent_task_id': None},
+                                {'name': TEST_RANDOM_STR, 'owner': TEST_USER,
+                                 'parent_task_id': 1}])
+            for table in mo.BaseModel.metadata.tables.values():
+                for index in table.indexes:
+                    index.drop(connection)
+            mo.TaskClosure.__table__.drop(connection)
+            relations = mo.TaskUserRelation.__table__
+            connection.execute(relations.insert(),
+                               [{'user': TEST_USER, 'task_id': 1},
+                                {'user': TEST_USER, 'task_id': 1},
+                                {'user': TEST_USER, 'task_id': 3}])
+            connection.execute(mo.Folder.__table__.insert(),
+                               {'name': TEST_NAME, 'user': TEST_USER})
+            folder_tasks = mo.task_folder_association_table
+            connection.execute(folder_tasks.insert(),
+                               [{'folder_id': 1, 'task_id': 1},
+                                {'folder_id': 1, 'task_id': 1},
+                                {'folder_id': 1, 'task_id': 2}])
+
+        with self.assertRaises(ex.SchemaVersionError):
+            mo.check_schema(self.engine)
+
+        self.assertEqual(migrations.upgrade(self.engine),
+                         (0, mo.SCHEMA_VERSION))
+        mo.check_schema(self.engine)
+        self.assertEqual(migrations.upgrade(self.engine),
+                         (mo.SCHEMA_VERSION, mo.SCHEMA_VERSION))
+
+        with self.engine.connect() as connection:
+            indexes = inspect(connection).get_indexes(
+                mo.TaskUserRelation.__tablename__)
+            self.assertEqual(len(indexes), 2)
+            self.assertEqual(
+                len(connection.execute(relations.select()).fetchall()), 1)
+            self.assertEqual(sorted(connection.execute(select(
+                folder_tasks.c.folder_id, folder_tasks.c.task_id)).fetchall()),
+                [(1, 1), (1, 2)])
+            self.assertEqual(connection.execute(text(
+                'SELECT rowid FROM tasks_fts WHERE tasks_fts MATCH :name'),
+                {'name': TEST_NAME}).fetchall(), [(1,)])
+            closure = mo.TaskClosure.__table__
+            self.assertEqual(sorted(connection.execute(select(
+                closure.c.ancestor_id, closure.c.descendant_id,
+                closure.c.depth)).fetchall()),
+                [(1, 1, 0), (1, 2, 1), (2, 2, 0)])
+            foreign_keys = inspect(connection).get_foreign_keys(
+                mo.TaskUserRelation.__tablename__)
+            self.assertEqual(foreign_keys[0]['options'],
+                             {'ondelete': 'CASCADE'})
+
+
+class PragmaProfileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'test.db')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_wal_profile(self):
+        engine = mo.create_lib_engine(DRIVER_NAME, self.path,
+                                      pragma_profile='wal')
+        with engine.connect() as connection:
+            cursor = connection.connection.cursor()
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+        engine.dispose()
+
+    def test_unknown_profile(self):
+        with self.assertRaises(KeyError):
+            mo.create_lib_engine(DRIVER_NAME, self.path,
+                                 pragma_profile=TEST_RANDOM_STR)
@@ -0,0 +1,77 @@
+"""
+    Micro benchmark of AppService hot lookups.
+    Compares per call time of lookups with the same lookups built
+    as new Query object on every call.
+
+    Usage:
+
+        python -m tests.lookups_benchmark [calls]
+"""
+
+import sys
+from datetime import datetime, timedelta
+from timeit import repeat
+
+from todolib import models as mo
+from todolib.services import AppService
+
+DRIVER_NAME = 'sqlite'
+CONNECTIONSTRING = ':memory:'
+USER = 'user'
+DEFAULT_CALLS = 2000
+
+
+def query_lookups(session, task, folder, reminder):
+    """Lookups as they were built before statements cache"""
+    return {
+        'get_task': lambda: session.query(mo.Task).join(
+            mo.TaskUserRelation).filter(
+                mo.TaskUserRelation.user == USER,
+                mo.Task.id == task.id).one_or_none(),
+        'get_task_user_relation': lambda: session.query(
+            mo.TaskUserRelation).filter_by(
+                user=USER, task_id=task.id).one_or_none(),
+        'get_folder': lambda: session.query(mo.Folder).filter_by(
+            id=folder.id, user=USER).one_or_none(),
+        'get_reminder': lambda: session.query(mo.Reminder).filter_by(
+            user=USER, id=reminder.id).one_or_none(),
+    }
+
+
+def service_lookups(service, task, folder, reminder):
+    return {
+        'get_task': lambda: service.get_task(user=USER, task_id=task.id),
+        'get_task_user_relation': lambda: service.get_task_user_relation(
+            user=USER, task_id=task.id),
+        'get_folder': lambda: service.get_folder(user=USER,
+                                                 folder_id=folder.id),
+        'get_reminder': lambda: service.get_reminder(
+            user=USER, reminder_id=reminder.id),
+    }
+
+
+def per_call(func, calls):
+    """Returns best per call time in microseconds"""
+    return min(repeat(func, number=calls, repeat=3)) / calls * 1e6
+
+
+def main(calls=DEFAULT_CALLS):
+    session = mo.set_up_connection(DRIVER_NAME, CONNECTIONSTRING)
+    service = AppService(session)
+    task = service.create_task(user=USER, name='task')
+    folder = service.create_folder(user=USER, name='folder')
+    reminder = service.create_reminder(
+        user=USER, task_id=task.id, date=datetime.now() + timedelta(days=1))
+
+    before = query_lookups(session, task, folder, reminder)
+    after = service_lookups(service, task, folder, reminder)
+
+    print(f'{"lookup":<24}{"query, us":>12}{"service, us":>14}')
+    for name in before:
+        print(f'{name:<24}'
+              f'{per_call(before[name], calls):>12.1f}'
+              f'{per_call(after[name], calls):>14.1f}')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_CALLS)
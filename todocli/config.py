@@ -6,6 +6,12 @@ DATABASE_PATH = APP_DATA_DIRECTORY
 
 DRIVER_NAME = 'sqlite'
 CONNECTION_STRING = os.path.join(DATABASE_PATH, 'todoapp.db')
+# key of todolib.models.SQLITE_PRAGMA_PROFILES
+SQLITE_PRAGMA_PROFILE = 'wal'
+# keep loaded objects state after commit
+EXPIRE_ON_COMMIT = False
+# count statements per command and library call, report N+1 queries to log
+TRACK_QUERIES = False
 
 CONFIG_FILE = os.path.join(APP_DATA_DIRECTORY, 'config.ini')
 
@@ -14,3 +20,12 @@ LOGS_DIRECTORY = APP_DATA_DIRECTORY
 LOG_FILE = 'todoapp.log'
 LOG_LEVEL = 'DEBUG'
 LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+# write log records from background thread
+LOG_ASYNC = True
+LOG_QUEUE_SIZE = 10000
+# block caller instead of dropping records when queue is full
+LOG_QUEUE_BLOCK = False
+# rotate log file by size. Rotated files are gzip compressed
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+LOG_COMPRESS = True
@@ -5,6 +5,8 @@ import textwrap
 
 from todolib.services import (AppService,
                               TaskStatus)
+from todolib.models import SCHEMA_VERSION, get_schema_version
+from todolib.migrations import upgrade
 
 from todolib.exceptions import LibError, LibWarning
 from todocli.user_service import UserService
@@ -43,14 +45,16 @@ def print_collection(collection, mes1=None, mes2=None):
         sys.exit(1)
 
 
-def print_task_with_subtask(service: AppService,
-                            user,
-                            task,
-                            indent=4,
-                            level=0):
-    print(textwrap.indent(str(task), ' ' * indent * level))
-    for task in service.get_subtasks(user=user, task_id=task.id):
-        print_task_with_subtask(service, user, task, indent, level+1)
+def print_page(page, mes1=None, mes2=None):
+    print_collection(page.items, mes1, mes2)
+    if page.cursor:
+        print(f'Next page: --after {page.cursor}')
+
+
+def print_task_with_subtask(subtree, indent=4):
+    """Prints tasks of AppService.get_subtree indented by depth"""
+    for task, depth in subtree:
+        print(textwrap.indent(str(task), ' ' * indent * depth))
 
 
 def task_show_handler(service: AppService, namespace):
@@ -60,63 +64,92 @@ def task_show_handler(service: AppService, namespace):
         print(task)
 
     elif namespace.show_type == 'own':
-        own_tasks = service.get_own_tasks(user=namespace.user)
-        print_collection(own_tasks,
-                         mes1='Your own tasks:',
-                         mes2='You dont have any tasks')
+        own_tasks = service.list_tasks(user=namespace.user,
+                                       owner=namespace.user,
+                                       limit=namespace.limit,
+                                       after=namespace.after,
+                                       load='summary')
+        print_page(own_tasks,
+                   mes1='Your own tasks:',
+                   mes2='You dont have any tasks')
 
     elif namespace.show_type == 'subtasks':
-        task = service.get_task(namespace.user, task_id=namespace.task_id)
-        subtasks = service.get_subtasks(user=namespace.user,
-                                        task_id=namespace.task_id)
-        if subtasks:
-            print_task_with_subtask(service, namespace.user, task)
+        subtree = service.get_subtree(user=namespace.user,
+                                      task_id=namespace.task_id,
+                                      load='summary')
+        if len(subtree) > 1:
+            print_task_with_subtask(subtree)
         else:
             print('Task dont have any subtasks')
 
     elif namespace.show_type == 'all':
-        available_tasks = service.get_available_tasks(
-            user=namespace.user)
-        print_collection(available_tasks,
-                         mes1='Available tasks:',
-                         mes2='You dont have any tasks')
+        available_tasks = service.list_tasks(user=namespace.user,
+                                             limit=namespace.limit,
+                                             after=namespace.after,
+                                             load='summary')
+        print_page(available_tasks,
+                   mes1='Available tasks:',
+                   mes2='You dont have any tasks')
 
     elif namespace.show_type == 'assigned':
-        assigned_tasks = service.get_user_assigned_tasks(user=namespace.user)
-        print_collection(assigned_tasks,
-                         mes1='Assigned tasks:',
-                         mes2='You dont have assigned tasks')
+        assigned_tasks = service.list_tasks(user=namespace.user,
+                                            assigned=namespace.user,
+                                            limit=namespace.limit,
+                                            after=namespace.after,
+                                            load='summary')
+        print_page(assigned_tasks,
+                   mes1='Assigned tasks:',
+                   mes2='You dont have assigned tasks')
 
     elif namespace.show_type == 'todo':
-        todo_tasks = service.get_filtered_tasks(user=namespace.user, status=TaskStatus.TODO)
-        print_collection(todo_tasks,
-                         mes1='Todo tasks:',
-                         mes2='You dont have todo tasks')
+        todo_tasks = service.list_tasks(user=namespace.user,
+                                        status=TaskStatus.TODO,
+                                        limit=namespace.limit,
+                                        after=namespace.after,
+                                        load='summary')
+        print_page(todo_tasks,
+                   mes1='Todo tasks:',
+                   mes2='You dont have todo tasks')
 
     elif namespace.show_type == 'inwork':
-        inwork_tasks = service.get_filtered_tasks(user=namespace.user, status=TaskStatus.INWORK)
-        print_collection(inwork_tasks,
-                         mes1='Inwork tasks:',
-                         mes2='You dont have any inwork tasks')
+        inwork_tasks = service.list_tasks(user=namespace.user,
+                                          status=TaskStatus.INWORK,
+                                          limit=namespace.limit,
+                                          after=namespace.after,
+                                          load='summary')
+        print_page(inwork_tasks,
+                   mes1='Inwork tasks:',
+                   mes2='You dont have any inwork tasks')
 
     elif namespace.show_type == 'done':
-        done_tasks = service.get_filtered_tasks(user=namespace.user, status=TaskStatus.DONE)
-        print_collection(done_tasks,
-                         mes1='Done tasks:',
-                         mes2='You dont have any done tasks')
+        done_tasks = service.list_tasks(user=namespace.user,
+                                        status=TaskStatus.DONE,
+                                        limit=namespace.limit,
+                                        after=namespace.after,
+                                        load='summary')
+        print_page(done_tasks,
+                   mes1='Done tasks:',
+                   mes2='You dont have any done tasks')
 
     elif namespace.show_type == 'archived':
-        archived_tasks = service.get_filtered_tasks(user=namespace.user, status=TaskStatus.ARCHIVED)
-        print_collection(archived_tasks,
-                         mes1='Archived tasks:',
-                         mes2='You dont have any archived tasks')
+        archived_tasks = service.list_tasks(user=namespace.user,
+                                            status=TaskStatus.ARCHIVED,
+                                            limit=namespace.limit,
+                                            after=namespace.after,
+                                            load='summary')
+        print_page(archived_tasks,
+                   mes1='Archived tasks:',
+                   mes2='You dont have any archived tasks')
 
     elif namespace.show_type == 'planless':
-        planless = [task for task in service.get_available_tasks(user=namespace.user)
-                    if task.plan is None]
-        print_collection(planless,
-                         mes1='Tasks without plan:',
-                         mes2='You dont have any tasks without a plan')
+        planless = service.list_tasks(user=namespace.user,
+                                      planless=True,
+                                      limit=namespace.limit,
+                                      after=namespace.after,
+                                      load='summary')
+        print_page(planless,
+                   mes1='Tasks without plan:',
+                   mes2='You dont have any tasks without a plan')
 
 
 def event_converter(arg):
@@ -208,12 +241,15 @@ def task_handler(service: AppService, namespace):
 
     elif namespace.action == 'delete':
         service.delete_task(user=namespace.user,
-                            task_id=namespace.task_id)
+                            task_id=namespace.task_id,
+                            recursive=namespace.subtasks)
         print(f'Task(ID={namespace.task_id}) has been deleted')
 
     elif namespace.action == 'search':
-        tasks = service.get_tasks_by_name(user=namespace.user,
-                                          name=namespace.name)
+        tasks = service.search_tasks(user=namespace.user,
+                                     query=namespace.query,
+                                     limit=namespace.limit,
+                                     load='summary')
         if tasks:
             for task in tasks:
                 print(task)
@@ -299,6 +335,14 @@ def folder_handler(service: AppService, namespace):
                                   task_id=namespace.task_id)
         print(f'Task(ID={namespace.task_id}) no longer in this folder')
 
+    elif namespace.action == 'move':
+
+        moved = service.move_tasks(user=namespace.user,
+                                   task_ids=namespace.task_ids,
+                                   from_folder_id=namespace.from_folder_id,
+                                   to_folder_id=namespace.to_folder_id)
+        print(f'{moved} tasks moved to folder ID={namespace.to_folder_id}')
+
     elif namespace.action == 'delete':
         service.delete_folder(user=namespace.user,
                               folder_id=namespace.folder_id)
@@ -321,22 +365,30 @@ def plan_show_handlers(service: AppService, namespace):
         tasks = None
         if namespace.tasks:
             tasks = service.get_generated_tasks_by_plan(user=namespace.user,
-                                                        plan_id=plan.id)
+                                                        plan_id=plan.id,
+                                                        load='summary')
         print_plan(plan, tasks)
 
     elif namespace.show_type == 'all':
-        plans = service.get_all_plans(user=namespace.user)
-        if not plans:
+        page = service.list_plans(
+            user=namespace.user,
+            limit=namespace.limit,
+            after=namespace.after,
+            load='detail' if namespace.tasks else None)
+        if not page.items:
             print('You dont have plans')
             sys.exit(1)
         if namespace.tasks:
-            for plan in plans:
-                tasks = service.get_generated_tasks_by_plan(user=namespace.user,
-                                                            plan_id=plan.id)
-                print_plan(plan, tasks)
+            tasks = service.get_generated_tasks_by_plans(user=namespace.user,
+                                                         plans=page.items,
+                                                         load='summary')
+            for plan in page.items:
+                print_plan(plan, tasks[plan.id])
         else:
-            for plan in plans:
+            for plan in page.items:
                 print(plan)
+        if page.cursor:
+            print(f'Next page: --after {page.cursor}')
 
 
 def plan_handler(service: AppService, namespace):
@@ -383,17 +435,23 @@ def reminder_show_handler(service, namespace):
             print(reminder.task)
 
     elif namespace.show_type == 'all':
-        reminders = service.get_all_reminders(user=namespace.user)
-        if not reminders:
+        page = service.list_reminders(
+            user=namespace.user,
+            limit=namespace.limit,
+            after=namespace.after,
+            load='detail' if namespace.tasks else None)
+        if not page.items:
             print('You dont have any reminders', file=sys.stderr)
             sys.exit(1)
         if namespace.tasks:
-            for reminder in reminders:
+            for reminder in page.items:
                 print(reminder, end='\n\n')
                 print(reminder.task)
         else:
-            for reminder in reminders:
+            for reminder in page.items:
                 print(reminder)
+        if page.cursor:
+            print(f'Next page: --after {page.cursor}')
 
 
 def reminder_handler(service: AppService, namespace):
@@ -463,6 +521,59 @@ def users_handler(service: AppService, namespace, user_serv: UserService):
             print('App dont have any users', file=sys.stderr)
 
 
+def stats_handler(service: AppService, namespace):
+    stats = service.task_stats(user=namespace.user,
+                               group_by=namespace.by)
+    if not stats:
+        print('You dont have any tasks', file=sys.stderr)
+        sys.exit(1)
+
+    folders = {}
+    if 'folder' in namespace.by:
+        folders = {folder.id: folder.name
+                   for folder in service.get_all_folders(namespace.user)}
+
+    def show(group, value):
+        if value is None:
+            return '-'
+        if group == 'folder':
+            return folders.get(value, value)
+        return getattr(value, 'value', value)
+
+    row = '{:<16}' * (len(namespace.by) + 2)
+    print(row.format(*(group.capitalize() for group in namespace.by),
+                     'Total', 'Overdue'))
+    for key, (total, overdue) in stats.items():
+        print(row.format(*(str(show(group, value))
+                           for group, value in zip(namespace.by, key)),
+                         total, overdue))
+    #  groups sums count task of several folders several times
+    total, overdue = service.task_stats(user=namespace.user,
+                                        group_by=())[()]
+    print(row.format(*([''] * (len(namespace.by) - 1)), 'All',
+                     total, overdue))
+
+
+@error_catcher
+def db_handler(engine, namespace):
+
+    if namespace.action == 'upgrade':
+        old_version, new_version = upgrade(engine)
+        if old_version == new_version:
+            print(f'Database schema is up to date (version {new_version})')
+        else:
+            print(f'Database schema upgraded from version {old_version} to {new_version}')
+
+    elif namespace.action == 'version':
+        with engine.connect() as connection:
+            version = get_schema_version(connection)
+        if version is None:
+            print('Database is empty')
+        else:
+            print(f'Database schema version: {version}')
+        print(f'Application schema version: {SCHEMA_VERSION}')
+
+
 def ensure_user_exist(user_serv, username):
     user = user_serv.get_user(username)
     if user is None:
@@ -503,3 +614,7 @@ def commands_handler(service: AppService, namespace,
     elif namespace.entity == 'reminder':
         namespace.user = check_auth(user_serv)
         reminder_handler(service, namespace)
+
+    elif namespace.entity == 'stats':
+        namespace.user = check_auth(user_serv)
+        stats_handler(service, namespace)
@@ -1,13 +1,16 @@
 from todolib.services import AppService
 from todolib.logging import setup_lib_logging
-from todolib.models import set_up_connection
+from todolib.models import set_up_connection, create_lib_engine
+from todolib.exceptions import SchemaVersionError
+from todolib.metrics import query_scope
 from todocli.parsers import get_args
-from todocli.handlers import commands_handler
+from todocli.handlers import commands_handler, db_handler
 from todocli.user_service import UserService
 import todocli.config as config
 
 
 import os
+import sys
 import warnings
 
 
@@ -20,20 +23,42 @@ def main():
     setup_lib_logging(log_file_path=log_file_path,
                       format=config.LOG_FORMAT,
                       log_enabled=config.LOG_ENABLED,
-                      log_level=config.LOG_LEVEL)
+                      log_level=config.LOG_LEVEL,
+                      async_logging=config.LOG_ASYNC,
+                      queue_size=config.LOG_QUEUE_SIZE,
+                      queue_block=config.LOG_QUEUE_BLOCK,
+                      max_bytes=config.LOG_MAX_BYTES,
+                      backup_count=config.LOG_BACKUP_COUNT,
+                      compress=config.LOG_COMPRESS)
 
-    session = set_up_connection(config.DRIVER_NAME, config.CONNECTION_STRING)
+    args = get_args()
+
+    if args.entity == 'db':
+        engine = create_lib_engine(config.DRIVER_NAME,
+                                   args.connection_string or config.CONNECTION_STRING,
+                                   pragma_profile=config.SQLITE_PRAGMA_PROFILE)
+        db_handler(engine, args)
+        return
+
+    try:
+        session = set_up_connection(config.DRIVER_NAME, config.CONNECTION_STRING,
+                                    expire_on_commit=config.EXPIRE_ON_COMMIT,
+                                    pragma_profile=config.SQLITE_PRAGMA_PROFILE,
+                                    track_queries=config.TRACK_QUERIES)
+    except SchemaVersionError as e:
+        print(e, file=sys.stderr)
+        print('Run "todoapp db upgrade" to upgrade database', file=sys.stderr)
+        sys.exit(1)
     service = AppService(session)
     user_serv = UserService(session, config.CONFIG_FILE)
 
-    args = get_args()
-
     user = user_serv.get_current_user()
     if user:
         service.execute_plans(user.username)
 
     warnings.filterwarnings('error')
-    commands_handler(service, args, user_serv)
+    with query_scope(f'cli.{args.entity}'):
+        commands_handler(service, args, user_serv)
 
 
 if __name__ == '__main__':
@@ -7,6 +7,9 @@ from dateutil.parser import parse
 from todolib.models import (TaskPriority,
                             TaskStatus,
                             Period)
+from todolib.services import STATS_GROUPS
+
+PAGE_SIZE = 50
 
 
 
@@ -46,6 +49,15 @@ def valid_int(x):
         raise argparse.ArgumentTypeError('Not a positive number')
 
 
+def add_page_arguments(parser: argparse):
+    parser.add_argument('--limit',
+                        type=valid_int,
+                        default=PAGE_SIZE,
+                        help=f'Amount of items to show. {PAGE_SIZE} by default')
+    parser.add_argument('--after',
+                        help='Show items after cursor printed with previous page')
+
+
 def task_show_parser(show_subparser: argparse):
     task_show = show_subparser.add_subparsers(dest='show_type',
                                               title='Show tasks info',
@@ -59,34 +71,42 @@ def task_show_parser(show_subparser: argparse):
                          help='Task id',
                          type=valid_int)
 
-    task_show.add_parser('own',
-                         help='Show tasks created by user')
+    own = task_show.add_parser('own',
+                               help='Show tasks created by user')
+    add_page_arguments(own)
 
     subtasks = task_show.add_parser('subtasks',
                                     help='Show subtasks by task id')
     subtasks.add_argument('task_id',
                           type=valid_int)
 
-    task_show.add_parser('all',
-                         help='Show all tasks user can access')
+    all_tasks = task_show.add_parser('all',
+                                     help='Show all tasks user can access')
+    add_page_arguments(all_tasks)
 
-    task_show.add_parser('assigned',
-                         help='Show tasks assigned on user')
+    assigned_tasks = task_show.add_parser('assigned',
+                                          help='Show tasks assigned on user')
+    add_page_arguments(assigned_tasks)
 
-    task_show.add_parser('todo',
-                         help='Show todo tasks')
+    todo_tasks = task_show.add_parser('todo',
+                                      help='Show todo tasks')
+    add_page_arguments(todo_tasks)
 
-    task_show.add_parser('inwork',
-                         help='Show inwork tasks')
+    inwork_tasks = task_show.add_parser('inwork',
+                                        help='Show inwork tasks')
+    add_page_arguments(inwork_tasks)
 
-    task_show.add_parser('done',
-                         help='Show done tasks')
+    done_tasks = task_show.add_parser('done',
+                                      help='Show done tasks')
+    add_page_arguments(done_tasks)
 
-    task_show.add_parser('archived',
-                         help='Show archived tasks')
+    archived_tasks = task_show.add_parser('archived',
+                                          help='Show archived tasks')
+    add_page_arguments(archived_tasks)
 
-    task_show.add_parser('planless',
-                         help='Show tasks without plan')
+    planless_tasks = task_show.add_parser('planless',
+                                          help='Show tasks without plan')
+    add_page_arguments(planless_tasks)
 
 
 def task_parser(sup_parser: argparse):
@@ -230,8 +250,13 @@ def task_parser(sup_parser: argparse):
                       type=valid_int)
 
     search = task_subparser.add_parser('search',
-                                       help='Case insensitive task search by name')
-    search.add_argument('name', help='Task name')
+                                       help='Full text task search by name and description')
+    search.add_argument('query',
+                        help='Words to search by prefix. Quote words to search phrase')
+    search.add_argument('--limit',
+                        type=valid_int,
+                        default=PAGE_SIZE,
+                        help=f'Amount of tasks to show. {PAGE_SIZE} by default')
 
     filter = task_subparser.add_parser('filter',
                                        help='Search tasks by specified params')
@@ -259,6 +284,9 @@ def task_parser(sup_parser: argparse):
                                        help='Delete task with provided id')
     delete.add_argument('task_id',
                         type=valid_int)
+    delete.add_argument('--subtasks',
+                        action='store_true',
+                        help='Delete subtasks too')
 
 
 def folder_show_parser(show_subparser: argparse):
@@ -324,6 +352,23 @@ def folder_parser(sup_parser: argparse):
                             required=True,
                             type=valid_int)
 
+    move = folder_subparser.add_parser(
+        'move',
+        help='Move tasks from one folder to other')
+    move.add_argument('-from',
+                      '--from_folder_id',
+                      required=True,
+                      type=valid_int)
+    move.add_argument('-to',
+                      '--to_folder_id',
+                      required=True,
+                      type=valid_int)
+    move.add_argument('-tid',
+                      '--task_ids',
+                      required=True,
+                      nargs='+',
+                      type=valid_int)
+
     edit = folder_subparser.add_parser(
         'edit',
         help='Edit folder by id')
@@ -360,6 +405,7 @@ def plan_show_parser(sup_parser: argparse):
     plan_all.add_argument('--tasks',
                           action='store_true',
                           help='Show plan. Task and generated tasks')
+    add_page_arguments(plan_all)
 
 
 def plan_parser(sup_parser: argparse):
@@ -463,6 +509,7 @@ def reminder_show_parser(sup_parser: argparse):
     reminder_all.add_argument('--tasks',
                               action='store_true',
                               help='Show reminders and its tasks')
+    add_page_arguments(reminder_all)
 
 
 def reminder_parser(sup_parser: argparse):
@@ -500,6 +547,35 @@ def reminder_parser(sup_parser: argparse):
     delete.add_argument('reminder_id', type=valid_int)
 
 
+def db_parser(sup_parser: argparse):
+    db_parser = sup_parser.add_parser('db',
+                                      help='Manage database schema')
+    db_subparser = db_parser.add_subparsers(dest='action',
+                                            metavar='',
+                                            description='Commands to work with database')
+    db_subparser.required = True
+
+    upgrade = db_subparser.add_parser('upgrade',
+                                      help='Upgrade database schema to current version')
+    upgrade.add_argument('-c', '--connection_string',
+                         help='Database to upgrade (app database by default)')
+
+    version = db_subparser.add_parser('version',
+                                      help='Show database schema version')
+    version.add_argument('-c', '--connection_string',
+                         help='Database to check (app database by default)')
+
+
+def stats_parser(sup_parser: argparse):
+    stats_parser = sup_parser.add_parser('stats',
+                                         help='Show amount of tasks and overdue tasks')
+    stats_parser.add_argument('--by',
+                              nargs='+',
+                              choices=list(STATS_GROUPS),
+                              default=['status'],
+                              help='Group tasks by. Status by default')
+
+
 def get_args():
     main_parser = DefaultHelpParser(prog='todo',
                                     description='todo tracker',
@@ -516,5 +592,7 @@ def get_args():
     folder_parser(entity_parser)
     plan_parser(entity_parser)
     reminder_parser(entity_parser)
+    stats_parser(entity_parser)
+    db_parser(entity_parser)
 
     return main_parser.parse_args()
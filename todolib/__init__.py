@@ -5,6 +5,7 @@
     services - contains AppService that provide api to work with library
     exceptions - contains library exceptions and warnings
     logging - contains logger, its decorator and setup method
+    metrics - contains calls statistics of library methods
     utils - containts utils that used by library
     validators - contains validate methods that used by library
 
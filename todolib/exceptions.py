@@ -12,6 +12,11 @@ class ObjectNotFoundError(LibError):
     pass
 
 
+class SchemaVersionError(LibError):
+    """Raises when database schema version doesnt match library version"""
+    pass
+
+
 class LibWarning(Warning):
     """Base lib warning class"""
     pass
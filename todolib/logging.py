@@ -5,9 +5,27 @@
 from logging import (getLogger,
                      FileHandler,
                      Formatter,
-                     getLevelName)
+                     getLevelName,
+                     DEBUG)
+from logging.handlers import (QueueHandler,
+                              QueueListener,
+                              RotatingFileHandler,
+                              TimedRotatingFileHandler)
 from functools import wraps
+from queue import Queue, Full
+from time import perf_counter
+import atexit
+import gzip
 import os
+import shutil
+
+from sqlalchemy import inspect
+
+from todolib.metrics import registry as metrics_registry
+
+#  limits of values representation in debug records
+MAX_LOGGED_ITEMS = 5
+MAX_LOGGED_LENGTH = 200
 
 
 def get_logger():
@@ -17,46 +35,184 @@ def get_logger():
     return getLogger('todolib')
 
 
+def describe(value):
+    """
+    Returns short representation of value for logging.
+    Library objects are described by their identity only, so it never
+    loads objects state from storage. Large collections are summarised.
+    """
+    if hasattr(value, '_sa_instance_state'):
+        state = inspect(value)
+        identity = state.identity
+        if identity is None:
+            return f'{type(value).__name__}(pending)'
+        return f'{type(value).__name__}(id={", ".join(map(str, identity))})'
+
+    if isinstance(value, dict):
+        items = [f'{key}: {describe(item)}'
+                 for key, item in list(value.items())[:MAX_LOGGED_ITEMS]]
+        return _describe_collection('{', items, '}', len(value))
+
+    if isinstance(value, (list, tuple, set, frozenset)):
+        items = [describe(item) for item in list(value)[:MAX_LOGGED_ITEMS]]
+        return _describe_collection('[', items, ']', len(value))
+
+    text = repr(value)
+    if len(text) > MAX_LOGGED_LENGTH:
+        return f'{text[:MAX_LOGGED_LENGTH]}...'
+    return text
+
+
+def _describe_collection(opening, items, closing, size):
+    if size > len(items):
+        items.append(f'... {size - len(items)} more')
+    return f'{opening}{", ".join(items)}{closing}'
+
+
 def log_decorator(func):
     """
-    Allows to wrap library methods with logging
+    Allows to wrap library methods with logging.
+    Arguments and result are formatted only when DEBUG level is enabled.
+    Calls latency and errors are recorded in todolib.metrics.
+    With queries tracking statements of the call are recorded as well.
     """
+    name = func.__qualname__
+
     @wraps(func)
     def wrapper(*args, **kwargs):
         logger = get_logger()
-        logger.info(f'call: {func.__name__}')
-        logger.debug(f'args: {args}')
-        logger.debug(f'kwargs: {kwargs}')
+        logger.info('call: %s', func.__name__)
+        debug = logger.isEnabledFor(DEBUG)
+        if debug:
+            logger.debug('args: %s', describe(args))
+            logger.debug('kwargs: %s', describe(kwargs))
+        scope = (metrics_registry.open_scope(name)
+                 if metrics_registry.track_queries else None)
+        start = perf_counter()
         try:
             result = func(*args, **kwargs)
-            logger.debug(f'result:\n {result}')
-            return result
         except Exception as e:
+            if metrics_registry.enabled:
+                metrics_registry.record(name, perf_counter() - start, True)
             logger.error(e)
             logger.exception(e)
             raise e
+        finally:
+            if scope is not None:
+                metrics_registry.close_scope(scope)
+        if metrics_registry.enabled:
+            metrics_registry.record(name, perf_counter() - start)
+        if debug:
+            logger.debug('result:\n %s', describe(result))
         return result
     return wrapper
 
 
+class BoundedQueueHandler(QueueHandler):
+    """
+    Queue handler that drops records or blocks caller when queue is full.
+    Amount of dropped records is stored in dropped attribute.
+    """
+
+    def __init__(self, queue, block=False):
+        super().__init__(queue)
+        self.block = block
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put(record, block=self.block)
+        except Full:
+            self.dropped += 1
+
+
+def _gzip_namer(name):
+    return f'{name}.gz'
+
+
+def _gzip_rotator(source, dest):
+    with open(source, 'rb') as source_file:
+        with gzip.open(dest, 'wb') as dest_file:
+            shutil.copyfileobj(source_file, dest_file)
+    os.remove(source)
+
+
+def _file_handler(log_file_path, max_bytes, rotate_when,
+                  backup_count, compress):
+    if rotate_when:
+        handler = TimedRotatingFileHandler(log_file_path,
+                                           when=rotate_when,
+                                           backupCount=backup_count)
+    elif max_bytes:
+        handler = RotatingFileHandler(log_file_path,
+                                      maxBytes=max_bytes,
+                                      backupCount=backup_count)
+    else:
+        return FileHandler(log_file_path)
+
+    if compress:
+        handler.namer = _gzip_namer
+        handler.rotator = _gzip_rotator
+    return handler
+
+
+_listener = None
+
+
+def stop_lib_logging():
+    """Stops background logging thread. Writes queued records to file.
+    Registered to run on interpreter exit.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+atexit.register(stop_lib_logging)
+
+
 def setup_lib_logging(log_file_path='/todoapp.log',
                       format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
                       log_level='DEBUG',
-                      log_enabled=True):
-    """Allows to setup logging settings
+                      log_enabled=True,
+                      async_logging=False,
+                      queue_size=10000,
+                      queue_block=False,
+                      max_bytes=0,
+                      rotate_when=None,
+                      backup_count=5,
+                      compress=False):
+    """Allows to setup logging settings.
+    With async_logging records are put in bounded queue and written to
+    file by background thread. Full queue drops records or blocks caller
+    (queue_block). Log file rotates by size (max_bytes) or by time
+    (rotate_when, e.g. 'midnight'). Rotated files might be gzip compressed.
     Parameters
     ----------
     log_file_path : str
     format : str
     log_level : str
     log_enabled : Bool
+    async_logging : Bool
+    queue_size : int
+    queue_block : Bool
+    max_bytes : int
+    rotate_when : str : TimedRotatingFileHandler when value
+    backup_count : int : amount of rotated files to keep
+    compress : Bool
     """
 
+    global _listener
     logger = get_logger()
+    stop_lib_logging()
 
     if log_enabled:
 
-        handler = FileHandler(log_file_path)
+        handler = _file_handler(log_file_path, max_bytes, rotate_when,
+                                backup_count, compress)
 
         formatter = Formatter(format)
         handler.setFormatter(formatter)
@@ -67,9 +223,14 @@ def setup_lib_logging(log_file_path='/todoapp.log',
         if logger.hasHandlers():
             logger.handlers.clear()
 
+        if async_logging:
+            queue = Queue(queue_size)
+            _listener = QueueListener(queue, handler)
+            _listener.start()
+            handler = BoundedQueueHandler(queue, block=queue_block)
+
         logger.disabled = False
         logger.addHandler(handler)
 
     else:
         logger.disabled = True
-
@@ -0,0 +1,312 @@
+"""
+    Module contains in-process metrics of library methods calls.
+    Every method wrapped with log_decorator records calls amount,
+    errors amount and latency histogram.
+
+    Engines instrumented with track_queries additionally attribute every
+    SQL statement to every library call and query scope that is running,
+    so counts include nested calls as latency does, and flag statements
+    repeated within one call as possible N+1 queries.
+
+    Usage:
+
+        >>> from todolib import metrics
+        >>> metrics.snapshot()['AppService.get_task']
+        {'calls': 3, 'errors': 0, 'total_time': 0.0012, 'mean': 0.0004,
+         'p50': 0.0004, 'p95': 0.0008, 'p99': 0.0008, 'max': 0.0007}
+"""
+
+from bisect import bisect_left
+from contextlib import contextmanager
+from logging import getLogger
+from threading import Lock, local
+from time import perf_counter
+from weakref import finalize
+
+from sqlalchemy import event
+
+#  latency histogram buckets upper bounds in seconds. 50us .. ~105s
+BUCKETS = tuple(0.00005 * 2 ** i for i in range(22))
+PERCENTILES = (('p50', 0.5), ('p95', 0.95), ('p99', 0.99))
+#  amount of identical statements within one call reported as N+1
+N_PLUS_ONE_THRESHOLD = 5
+#  name statements issued outside of any call are recorded under
+UNATTRIBUTED = '<unattributed>'
+
+
+class MethodStats:
+    """
+    Calls statistics of single method.
+    Latency histogram has fixed buckets, last one counts overflows.
+    """
+    __slots__ = ('calls', 'errors', 'total_time', 'max_time', 'histogram',
+                 'statements', 'sql_time', 'max_statements', 'n_plus_one')
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.histogram = [0] * (len(BUCKETS) + 1)
+        self.statements = 0
+        self.sql_time = 0.0
+        self.max_statements = 0
+        self.n_plus_one = 0
+
+    def add(self, elapsed, error=False):
+        self.calls += 1
+        if error:
+            self.errors += 1
+        self.total_time += elapsed
+        if elapsed > self.max_time:
+            self.max_time = elapsed
+        self.histogram[bisect_left(BUCKETS, elapsed)] += 1
+
+    def add_queries(self, statements, sql_time, n_plus_one=0):
+        self.statements += statements
+        self.sql_time += sql_time
+        if statements > self.max_statements:
+            self.max_statements = statements
+        self.n_plus_one += n_plus_one
+
+    def merge(self, other):
+        self.calls += other.calls
+        self.errors += other.errors
+        self.total_time += other.total_time
+        self.max_time = max(self.max_time, other.max_time)
+        for i, amount in enumerate(other.histogram):
+            self.histogram[i] += amount
+        self.statements += other.statements
+        self.sql_time += other.sql_time
+        self.max_statements = max(self.max_statements, other.max_statements)
+        self.n_plus_one += other.n_plus_one
+
+    def percentile(self, fraction):
+        """Returns upper bound of bucket that contains percentile"""
+        if not self.calls:
+            return 0.0
+        threshold = fraction * self.calls
+        passed = 0
+        for bound, amount in zip(BUCKETS, self.histogram):
+            passed += amount
+            if passed >= threshold:
+                return min(bound, self.max_time)
+        return self.max_time
+
+    def summary(self):
+        summary = {
+            'calls': self.calls,
+            'errors': self.errors,
+            'total_time': self.total_time,
+            'mean': self.total_time / self.calls if self.calls else 0.0,
+        }
+        for name, fraction in PERCENTILES:
+            summary[name] = self.percentile(fraction)
+        summary['max'] = self.max_time
+        summary['statements'] = self.statements
+        summary['sql_time'] = self.sql_time
+        summary['max_statements'] = self.max_statements
+        summary['n_plus_one'] = self.n_plus_one
+        return summary
+
+
+class QueryScope:
+    """
+    Statements issued during one call.
+    shapes maps statement text to amount of its executions.
+    """
+    __slots__ = ('name', 'statements', 'sql_time', 'shapes')
+
+    def __init__(self, name):
+        self.name = name
+        self.statements = 0
+        self.sql_time = 0.0
+        self.shapes = {}
+
+    def add(self, statement, elapsed):
+        self.statements += 1
+        self.sql_time += elapsed
+        self.shapes[statement] = self.shapes.get(statement, 0) + 1
+
+    def repeated(self):
+        """Returns statements executed N_PLUS_ONE_THRESHOLD times or more"""
+        return {statement: amount
+                for statement, amount in self.shapes.items()
+                if amount >= N_PLUS_ONE_THRESHOLD}
+
+
+class _ShardOwner:
+    """Thread local holder of shard. Dies together with its thread"""
+    __slots__ = ('shard', '__weakref__')
+
+    def __init__(self, shard):
+        self.shard = shard
+
+
+class MetricsRegistry:
+    """
+    Registry of methods statistics.
+    Every thread records in its own shard, so recording takes no locks.
+    Shards are merged on snapshot. Shard of finished thread is folded
+    into retired statistics, so amount of shards follows amount of
+    alive threads.
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.track_queries = False
+        self._lock = Lock()
+        self._local = local()
+        self._shards = []
+        self._retired = {}
+        #  shards of finished threads waiting to be folded. Finalizer
+        #  may run while lock is held, so it only appends
+        self._dead = []
+
+    def _shard(self):
+        try:
+            return self._local.owner.shard
+        except AttributeError:
+            shard = {}
+            owner = self._local.owner = _ShardOwner(shard)
+            with self._lock:
+                self._fold_dead()
+                self._shards.append(shard)
+            finalize(owner, self._dead.append, shard)
+            return shard
+
+    def _fold_dead(self):
+        """Merges shards of finished threads into retired statistics.
+        Called with lock held
+        """
+        while self._dead:
+            shard = self._dead.pop()
+            self._shards.remove(shard)
+            for name, stats in shard.items():
+                self._retired.setdefault(name, MethodStats()).merge(stats)
+
+    def _stats(self, name):
+        shard = self._shard()
+        stats = shard.get(name)
+        if stats is None:
+            stats = shard[name] = MethodStats()
+        return stats
+
+    def record(self, name, elapsed, error=False):
+        """Records method call that took elapsed seconds"""
+        self._stats(name).add(elapsed, error)
+
+    def _scopes(self):
+        try:
+            return self._local.scopes
+        except AttributeError:
+            scopes = self._local.scopes = []
+            return scopes
+
+    def open_scope(self, name):
+        """Starts attributing statements of current thread to name.
+        Scopes nest, statement counts toward every open scope, e.g.
+        both library method and view that called it.
+        """
+        scope = QueryScope(name)
+        self._scopes().append(scope)
+        return scope
+
+    def close_scope(self, scope):
+        """Records statements of scope and reports repeated ones"""
+        scopes = self._scopes()
+        if scopes and scopes[-1] is scope:
+            scopes.pop()
+        elif scope in scopes:
+            scopes.remove(scope)
+        repeated = scope.repeated()
+        self._stats(scope.name).add_queries(scope.statements,
+                                            scope.sql_time,
+                                            len(repeated))
+        logger = getLogger('todolib')
+        logger.debug('queries: %s issued %d statements in %.6fs',
+                     scope.name, scope.statements, scope.sql_time)
+        for statement, amount in repeated.items():
+            logger.warning('possible N+1 in %s: %d x %s',
+                           scope.name, amount, statement)
+
+    def record_statement(self, statement, elapsed):
+        scopes = self._scopes()
+        if not scopes:
+            self._stats(UNATTRIBUTED).add_queries(1, elapsed)
+        for scope in scopes:
+            scope.add(statement, elapsed)
+
+    def snapshot(self):
+        """Returns dict of methods names and their statistics summary"""
+        merged = {}
+        with self._lock:
+            self._fold_dead()
+            for shard in (self._retired, *self._shards):
+                for name, stats in list(shard.items()):
+                    merged.setdefault(name, MethodStats()).merge(stats)
+        return {name: stats.summary() for name, stats in merged.items()}
+
+    def reset(self):
+        with self._lock:
+            self._fold_dead()
+            self._retired.clear()
+            for shard in self._shards:
+                shard.clear()
+
+
+registry = MetricsRegistry()
+
+
+def snapshot():
+    """Returns statistics of library methods calls"""
+    return registry.snapshot()
+
+
+def reset():
+    """Clears collected statistics"""
+    registry.reset()
+
+
+def enable():
+    registry.enabled = True
+
+
+def disable():
+    registry.enabled = False
+
+
+@contextmanager
+def query_scope(name):
+    """Attributes statements issued inside block to name.
+    Allows to find N+1 queries in code that calls several library methods
+    or lazy loads relationships, e.g. cli handlers and views.
+    Library calls inside block are recorded under their own names too.
+    Yields QueryScope or None when queries are not tracked.
+    """
+    scope = registry.open_scope(name) if registry.track_queries else None
+    try:
+        yield scope
+    finally:
+        if scope is not None:
+            registry.close_scope(scope)
+
+
+def _before_cursor_execute(conn, cursor, statement,
+                           parameters, context, executemany):
+    conn.info.setdefault('query_start_time', []).append(perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement,
+                          parameters, context, executemany):
+    elapsed = perf_counter() - conn.info['query_start_time'].pop()
+    registry.record_statement(statement, elapsed)
+
+
+def instrument_engine(engine):
+    """Attaches statements listeners to engine and enables queries tracking"""
+    if not event.contains(engine, 'before_cursor_execute',
+                          _before_cursor_execute):
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    registry.track_queries = True
@@ -0,0 +1,310 @@
+"""
+    Module contains database schema migrations.
+    Every migration upgrades schema from previous version to its key
+    version. Migration receives connection in opened transaction.
+    On sqlite foreign keys are disabled during upgrade, so tables
+    can be rebuilt without triggering ON DELETE actions.
+"""
+
+from sqlalchemy import (MetaData, Table, Column, ForeignKey, Index,
+                        Integer, String, Boolean, DateTime, Enum, text)
+from sqlalchemy.schema import CreateTable
+
+from todolib.models import (BaseModel,
+                            SchemaVersion,
+                            TASKS_FTS_DDL,
+                            SCHEMA_VERSION,
+                            get_schema_version,
+                            set_schema_version)
+from todolib.exceptions import SchemaVersionError
+
+#  tables as of schema version 5. Migrations build tables and indexes
+#  from this copy, so later models changes do not break upgrade of
+#  old databases
+SCHEMA_V5 = MetaData()
+
+Table('folders', SCHEMA_V5,
+      Column('id', Integer, primary_key=True),
+      Column('user', String),
+      Column('name', String),
+      Index('ix_folders_user_name', 'user', 'name'))
+
+Table('tasks', SCHEMA_V5,
+      Column('id', Integer, primary_key=True),
+      Column('owner', String, index=True),
+      Column('parent_task_id', Integer,
+             ForeignKey('tasks.id', ondelete='SET NULL'), index=True),
+      Column('assigned', String, index=True),
+      Column('name', String),
+      Column('description', String),
+      Column('priority', Enum('LOW', 'MEDIUM', 'HIGH',
+                              name='taskpriority'), nullable=False),
+      Column('status', Enum('TODO', 'INWORK', 'DONE', 'ARCHIVED',
+                            name='taskstatus'),
+             nullable=False, index=True),
+      Column('event', Boolean, nullable=False),
+      Column('start_date', DateTime),
+      Column('end_date', DateTime),
+      Column('created', DateTime, nullable=False),
+      Column('updated', DateTime, nullable=False))
+
+Table('task_users_relation', SCHEMA_V5,
+      Column('id', Integer, primary_key=True),
+      Column('user', String),
+      Column('task_id', Integer, ForeignKey('tasks.id', ondelete='CASCADE')),
+      Index('ix_task_users_relation_user_task_id', 'user', 'task_id',
+            unique=True),
+      Index('ix_task_users_relation_task_id_user', 'task_id', 'user'))
+
+Table('task_closure', SCHEMA_V5,
+      Column('ancestor_id', Integer,
+             ForeignKey('tasks.id', ondelete='CASCADE'), primary_key=True),
+      Column('descendant_id', Integer,
+             ForeignKey('tasks.id', ondelete='CASCADE'), primary_key=True),
+      Column('depth', Integer, nullable=False),
+      Index('ix_task_closure_descendant_id_depth', 'descendant_id', 'depth'))
+
+Table('task_folders', SCHEMA_V5,
+      Column('task_id', Integer, ForeignKey('tasks.id', ondelete='CASCADE')),
+      Column('folder_id', Integer,
+             ForeignKey('folders.id', ondelete='CASCADE')),
+      Index('ix_task_folders_folder_id_task_id', 'folder_id', 'task_id',
+            unique=True),
+      Index('ix_task_folders_task_id', 'task_id'))
+
+Table('plans', SCHEMA_V5,
+      Column('id', Integer, primary_key=True),
+      Column('task_id', Integer, ForeignKey('tasks.id', ondelete='CASCADE'),
+             index=True),
+      Column('user', String, index=True),
+      Column('period', Enum('MIN', 'HOUR', 'DAY', 'WEEK', 'MONTH', 'YEAR',
+                            name='period')),
+      Column('period_amount', Integer),
+      Column('end_type', Enum('NEVER', 'AMOUNT', 'DATE', name='endtype')),
+      Column('repetitions_amount', Integer, nullable=False),
+      Column('repetitions_counter', Integer, nullable=False),
+      Column('last_activated', DateTime),
+      Column('start_date', DateTime),
+      Column('end_date', DateTime))
+
+Table('reminders', SCHEMA_V5,
+      Column('id', Integer, primary_key=True),
+      Column('date', DateTime, index=True),
+      Column('task_id', Integer, ForeignKey('tasks.id', ondelete='CASCADE'),
+             index=True),
+      Column('user', String),
+      Index('ix_reminders_user_task_id', 'user', 'task_id'))
+
+#  indexes added in schema version 6
+PAGE_INDEXES = MetaData()
+
+Table('tasks', PAGE_INDEXES,
+      Column('id', Integer),
+      Column('end_date', DateTime),
+      Index('ix_tasks_end_date_id', 'end_date', 'id'))
+
+Table('reminders', PAGE_INDEXES,
+      Column('id', Integer),
+      Column('user', String),
+      Column('date', DateTime),
+      Index('ix_reminders_user_id', 'user', 'id'),
+      Index('ix_reminders_user_date_id', 'user', 'date', 'id'))
+
+
+def _create_schema_version(connection):
+    """Database created before versioning. Adds version table only"""
+    SchemaVersion.__table__.create(connection, checkfirst=True)
+
+
+def _create_indexes(connection, *names, metadata=SCHEMA_V5):
+    indexes = {index.name: index
+               for table in metadata.tables.values()
+               for index in table.indexes}
+    for name in names:
+        indexes[name].create(connection, checkfirst=True)
+
+
+def _add_lookup_indexes(connection):
+    """Removes duplicated relations and adds lookup indexes"""
+    connection.execute(text(
+        'DELETE FROM task_users_relation WHERE id NOT IN '
+        '(SELECT MIN(id) FROM task_users_relation GROUP BY user, task_id)'))
+    #  links have no id column, so distinct rows are copied back
+    #  through temporary table
+    duplicated = connection.execute(text(
+        'SELECT 1 FROM task_folders GROUP BY folder_id, task_id '
+        'HAVING COUNT(*) > 1')).first()
+    if duplicated:
+        for statement in (
+                'CREATE TEMPORARY TABLE task_folders_distinct AS '
+                'SELECT DISTINCT folder_id, task_id FROM task_folders',
+                'DELETE FROM task_folders',
+                'INSERT INTO task_folders (folder_id, task_id) '
+                'SELECT folder_id, task_id FROM task_folders_distinct',
+                'DROP TABLE task_folders_distinct'):
+            connection.execute(text(statement))
+
+    _create_indexes(connection,
+                    'ix_task_users_relation_user_task_id',
+                    'ix_task_users_relation_task_id_user',
+                    'ix_task_folders_folder_id_task_id',
+                    'ix_task_folders_task_id',
+                    'ix_tasks_owner',
+                    'ix_tasks_assigned',
+                    'ix_tasks_parent_task_id',
+                    'ix_tasks_status',
+                    'ix_folders_user_name',
+                    'ix_plans_user',
+                    'ix_plans_task_id',
+                    'ix_reminders_user_task_id',
+                    'ix_reminders_task_id',
+                    'ix_reminders_date')
+
+
+def _add_tasks_fts(connection):
+    """Adds full text index of tasks and fills it with existing tasks"""
+    if connection.dialect.name != 'sqlite':
+        return
+    for statement in TASKS_FTS_DDL:
+        connection.execute(text(statement))
+    connection.execute(text(
+        "INSERT INTO tasks_fts(tasks_fts) VALUES ('rebuild')"))
+
+
+def _add_task_closure(connection):
+    """Adds tasks hierarchy closure table and fills it from parent ids.
+    Depth is limited to stop on looped hierarchies
+    """
+    SCHEMA_V5.tables['task_closure'].create(connection, checkfirst=True)
+    connection.execute(text(
+        'INSERT INTO task_closure (ancestor_id, descendant_id, depth) '
+        'WITH RECURSIVE closure(ancestor_id, descendant_id, depth) AS ('
+        'SELECT id, id, 0 FROM tasks '
+        'UNION ALL '
+        'SELECT closure.ancestor_id, tasks.id, closure.depth + 1 '
+        'FROM tasks JOIN closure '
+        'ON tasks.parent_task_id = closure.descendant_id '
+        'WHERE closure.depth < 1000) '
+        'SELECT ancestor_id, descendant_id, MIN(depth) FROM closure '
+        'GROUP BY ancestor_id, descendant_id'))
+
+
+def _rebuild_table(connection, table):
+    """Recreates sqlite table from table definition keeping its rows.
+    sqlite cant alter constraints of existing table
+    """
+    quote = connection.dialect.identifier_preparer.quote
+    name = quote(table.name)
+    new_name = quote(f'{table.name}_new')
+    ddl = str(CreateTable(table).compile(dialect=connection.dialect))
+    connection.execute(text(ddl.replace(f'CREATE TABLE {name} ',
+                                        f'CREATE TABLE {new_name} ', 1)))
+    columns = ', '.join(quote(column.name) for column in table.columns)
+    connection.execute(text(f'INSERT INTO {new_name} ({columns}) '
+                            f'SELECT {columns} FROM {name}'))
+    connection.execute(text(f'DROP TABLE {name}'))
+    connection.execute(text(f'ALTER TABLE {new_name} RENAME TO {name}'))
+    for index in table.indexes:
+        index.create(connection)
+
+
+def _add_delete_cascades(connection):
+    """Removes rows of deleted tasks and adds ON DELETE actions.
+    Other dialects keep their constraints, AppService.delete_task
+    removes dependent rows explicitly anyway
+    """
+    for table in ('task_users_relation', 'task_folders',
+                  'plans', 'reminders'):
+        connection.execute(text(
+            f'DELETE FROM {table} '
+            'WHERE task_id NOT IN (SELECT id FROM tasks)'))
+    connection.execute(text(
+        'DELETE FROM task_closure '
+        'WHERE ancestor_id NOT IN (SELECT id FROM tasks) '
+        'OR descendant_id NOT IN (SELECT id FROM tasks)'))
+    connection.execute(text(
+        'UPDATE tasks SET parent_task_id = NULL '
+        'WHERE parent_task_id NOT IN (SELECT id FROM tasks)'))
+
+    if connection.dialect.name != 'sqlite':
+        return
+    for name in ('tasks', 'task_users_relation', 'task_closure',
+                 'task_folders', 'plans', 'reminders'):
+        _rebuild_table(connection, SCHEMA_V5.tables[name])
+    #  triggers are dropped with old tasks table
+    for statement in TASKS_FTS_DDL:
+        connection.execute(text(statement))
+
+
+def _add_page_indexes(connection):
+    """Adds indexes list methods pages are walked by"""
+    _create_indexes(connection,
+                    'ix_tasks_end_date_id',
+                    'ix_reminders_user_id',
+                    'ix_reminders_user_date_id',
+                    metadata=PAGE_INDEXES)
+
+
+MIGRATIONS = {
+    1: _create_schema_version,
+    2: _add_lookup_indexes,
+    3: _add_tasks_fts,
+    4: _add_task_closure,
+    5: _add_delete_cascades,
+    6: _add_page_indexes,
+}
+
+
+def upgrade(engine):
+    """Allows to upgrade database schema to SCHEMA_VERSION.
+    Parameters
+    ----------
+    engine : engine object
+    Returns
+    -------
+    (int, int) : schema version before and after upgrade
+    """
+    with engine.connect() as connection:
+        foreign_keys = _disable_foreign_keys(connection)
+        try:
+            with connection.begin():
+                return _upgrade(connection)
+        finally:
+            if foreign_keys:
+                connection.exec_driver_sql('PRAGMA foreign_keys=ON')
+                connection.commit()
+
+
+def _disable_foreign_keys(connection):
+    """Disables sqlite foreign keys of connection.
+    Pragma has no effect inside transaction, so it is committed at once.
+    Returns
+    -------
+    Bool : foreign keys were enabled
+    """
+    if connection.dialect.name != 'sqlite':
+        return False
+    enabled = connection.exec_driver_sql('PRAGMA foreign_keys').scalar()
+    connection.exec_driver_sql('PRAGMA foreign_keys=OFF')
+    connection.commit()
+    return bool(enabled)
+
+
+def _upgrade(connection):
+    version = get_schema_version(connection)
+
+    if version is None:
+        BaseModel.metadata.create_all(connection)
+        set_schema_version(connection, SCHEMA_VERSION)
+        return version, SCHEMA_VERSION
+
+    if version > SCHEMA_VERSION:
+        raise SchemaVersionError(
+            f'Database schema version {version} is newer than '
+            f'library schema version {SCHEMA_VERSION}')
+
+    for target in range(version + 1, SCHEMA_VERSION + 1):
+        MIGRATIONS[target](connection)
+        set_schema_version(connection, target)
+
+    return version, SCHEMA_VERSION
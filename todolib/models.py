@@ -3,6 +3,7 @@
 """
 
 from datetime import datetime
+from threading import Lock
 import enum
 
 from sqlalchemy import (
@@ -13,50 +14,285 @@ from sqlalchemy import (
     DateTime,
     Table,
     Boolean,
-    Enum)
+    Enum,
+    Index,
+    DDL,
+    select,
+    table,
+    column)
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import (relationship,
                             sessionmaker,
                             backref,
                             scoped_session)
-from sqlalchemy import create_engine
+from sqlalchemy.pool import QueuePool
+from sqlalchemy import create_engine, event
+
+
+from todolib.exceptions import SchemaVersionError
+from todolib import metrics
 
 
 FORMAT = '%Y-%m-%d %H:%M'
 BaseModel = declarative_base()
 
+#  bump on every schema change and add migration to todolib.migrations
+SCHEMA_VERSION = 6
+
+POOL_OPTIONS = ('pool_size', 'max_overflow', 'pool_timeout')
+
+#  pragmas applied on every new sqlite connection.
+#  foreign_keys enables ON DELETE actions declared in models
+SQLITE_PRAGMA_PROFILES = {
+    'default': {
+        'foreign_keys': 'ON',
+    },
+    'wal': {
+        'foreign_keys': 'ON',
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64 * 1024,
+        'temp_store': 'MEMORY',
+        'busy_timeout': 5000,
+    },
+}
+
+
+def _pragmas_listener(pragmas):
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+    return set_pragmas
+
+
+def create_lib_engine(driver_name, connection_string,
+                      pragma_profile=None, track_queries=False,
+                      **engine_options):
+    """Allows to create engine object.
+    Pool options (pool_size, max_overflow, pool_timeout) switch engine
+    to QueuePool unless poolclass is passed explicitly.
+    Parameters
+    ----------
+    driver_name: str
+    connection_string: str
+    pragma_profile: str : SQLITE_PRAGMA_PROFILES key. sqlite only
+    track_queries: Bool : attribute statements to library calls
+        and report possible N+1 queries, see todolib.metrics
+    engine_options: keyword arguments passed to sqlalchemy create_engine
+    Returns
+    -------
+    engine object
+    """
+    connect_args = engine_options.pop('connect_args', {})
+    if driver_name.startswith('sqlite'):
+        connect_args.setdefault('check_same_thread', False)
+
+    if (any(option in engine_options for option in POOL_OPTIONS) and
+            'poolclass' not in engine_options):
+        engine_options['poolclass'] = QueuePool
+
+    engine = create_engine(f'{driver_name}:///{connection_string}',
+                           connect_args=connect_args,
+                           **engine_options)
+
+    if pragma_profile and engine.dialect.name == 'sqlite':
+        try:
+            pragmas = SQLITE_PRAGMA_PROFILES[pragma_profile]
+        except KeyError as e:
+            raise KeyError(f'Pragma profile {pragma_profile} not Found') from e
+        event.listen(engine, 'connect', _pragmas_listener(pragmas))
+
+    if track_queries:
+        metrics.instrument_engine(engine)
 
-def set_up_connection(driver_name, connection_string):
+    return engine
+
+
+def set_up_connection(driver_name, connection_string,
+                      expire_on_commit=True, **engine_options):
     """Allows to create session object.
+    With expire_on_commit=False loaded objects keep their state after
+    commit and are not reloaded on next attribute access.
+    Use AppService.refresh to reload object explicitly.
     Parameters
     ----------
     driver_name: str
     connection_string: str
+    expire_on_commit: Bool
+    engine_options: keyword arguments passed to create_lib_engine
     Returns
     -------
     session object
     """
-    engine = create_engine(f'{driver_name}:///{connection_string}',
-                           connect_args={'check_same_thread': False})
-    session = sessionmaker(bind=engine)
-    BaseModel.metadata.create_all(engine)
+    engine = create_lib_engine(driver_name, connection_string,
+                               **engine_options)
+    session = sessionmaker(bind=engine, expire_on_commit=expire_on_commit)
+    check_schema(engine)
     return scoped_session(session)
 
 
+def get_schema_version(connection):
+    """Returns stored schema version.
+    0 for database created before versioning, None for empty database
+    """
+    dialect = connection.dialect
+    if not dialect.has_table(connection, SchemaVersion.__tablename__):
+        if dialect.has_table(connection, Task.__tablename__):
+            return 0
+        return None
+    return connection.execute(select(SchemaVersion.version)).scalar()
+
+
+def set_schema_version(connection, version):
+    table = SchemaVersion.__table__
+    connection.execute(table.delete())
+    connection.execute(table.insert().values(version=version))
+
+
+def check_schema(engine):
+    """Ensures that database schema is up to date.
+    Creates schema on empty database. Otherwise only compares stored
+    version with SCHEMA_VERSION and raises SchemaVersionError on mismatch.
+    Use todolib.migrations.upgrade to upgrade outdated database.
+    """
+    with engine.begin() as connection:
+        version = get_schema_version(connection)
+        if version is None:
+            BaseModel.metadata.create_all(connection)
+            set_schema_version(connection, SCHEMA_VERSION)
+            return
+
+    if version != SCHEMA_VERSION:
+        raise SchemaVersionError(
+            f'Database schema version is {version}, '
+            f'library requires version {SCHEMA_VERSION}. '
+            'Upgrade database schema')
+
+
+class ConnectionRegistry:
+    """
+    Process wide registry of engines and sessions.
+    Builds one engine per (driver_name, connection_string) pair and
+    hands out thread local sessions bound to it. Call remove_sessions
+    at the end of request to return connections to the pool.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._engines = {}
+        self._sessions = {}
+
+    def get_engine(self, driver_name, connection_string, **engine_options):
+        """Returns engine for connection. Engine options are applied
+        only when engine is built (first call for the connection).
+        Raises SchemaVersionError when database schema is outdated.
+        """
+        key = (driver_name, connection_string)
+        engine = self._engines.get(key)
+        if engine is None:
+            with self._lock:
+                engine = self._engines.get(key)
+                if engine is None:
+                    engine = create_lib_engine(driver_name,
+                                               connection_string,
+                                               **engine_options)
+                    check_schema(engine)
+                    self._engines[key] = engine
+        return engine
+
+    def get_session(self, driver_name, connection_string,
+                    expire_on_commit=True, **engine_options):
+        """Returns scoped session. Every thread gets its own session
+        until remove_sessions is called from that thread.
+        Session options are applied only when session factory is built.
+        """
+        key = (driver_name, connection_string)
+        session = self._sessions.get(key)
+        if session is None:
+            engine = self.get_engine(driver_name, connection_string,
+                                     **engine_options)
+            with self._lock:
+                session = self._sessions.setdefault(
+                    key,
+                    scoped_session(sessionmaker(
+                        bind=engine, expire_on_commit=expire_on_commit)))
+        return session
+
+    def remove_sessions(self):
+        """Closes sessions of current thread"""
+        for session in list(self._sessions.values()):
+            session.remove()
+
+    def dispose(self):
+        """Closes all sessions and engines pools"""
+        with self._lock:
+            for session in self._sessions.values():
+                session.remove()
+            for engine in self._engines.values():
+                engine.dispose()
+            self._sessions.clear()
+            self._engines.clear()
+
+
+registry = ConnectionRegistry()
+
+
+class SchemaVersion(BaseModel):
+    """
+    Model that stores version of database schema
+    """
+    __tablename__ = 'schema_version'
+    version = Column(Integer, primary_key=True, autoincrement=False)
+
+
 class TaskUserRelation(BaseModel):
     """
     Model that indicate user access to specific task
     """
     __tablename__ = 'task_users_relation'
+    __table_args__ = (
+        #  one relation per user and task. Serves user tasks lookups
+        Index('ix_task_users_relation_user_task_id', 'user', 'task_id',
+              unique=True),
+        #  serves task members lookups
+        Index('ix_task_users_relation_task_id_user', 'task_id', 'user'),
+    )
     id = Column(Integer, primary_key=True)
     user = Column(String)
-    task_id = Column(Integer, ForeignKey('tasks.id'))
+    task_id = Column(Integer, ForeignKey('tasks.id', ondelete='CASCADE'))
+
+
+class TaskClosure(BaseModel):
+    """
+    Model that indicates task is descendant of other task.
+    Every task has row with itself on depth 0, its subtasks on depth 1 etc.
+    Kept in sync with Task.parent_task_id by AppService
+    """
+    __tablename__ = 'task_closure'
+    __table_args__ = (
+        #  serves ancestors lookups
+        Index('ix_task_closure_descendant_id_depth',
+              'descendant_id', 'depth'),
+    )
+    ancestor_id = Column(Integer, ForeignKey('tasks.id', ondelete='CASCADE'),
+                         primary_key=True)
+    descendant_id = Column(Integer,
+                           ForeignKey('tasks.id', ondelete='CASCADE'),
+                           primary_key=True)
+    depth = Column(Integer, nullable=False)
 
 
 task_folder_association_table = Table(
     'task_folders', BaseModel.metadata,
-    Column('task_id', Integer, ForeignKey('tasks.id')),
-    Column('folder_id', Integer, ForeignKey('folders.id'))
+    Column('task_id', Integer, ForeignKey('tasks.id', ondelete='CASCADE')),
+    Column('folder_id', Integer,
+           ForeignKey('folders.id', ondelete='CASCADE')),
+    Index('ix_task_folders_folder_id_task_id', 'folder_id', 'task_id',
+          unique=True),
+    Index('ix_task_folders_task_id', 'task_id')
 )
 
 
@@ -75,6 +311,9 @@ class TaskPriority(enum.Enum):
 
 class Folder(BaseModel):
     __tablename__ = 'folders'
+    __table_args__ = (
+        Index('ix_folders_user_name', 'user', 'name'),
+    )
     id = Column(Integer, primary_key=True)
     user = Column(String)
 
@@ -94,10 +333,16 @@ class Folder(BaseModel):
 
 class Task(BaseModel):
     __tablename__ = 'tasks'
+    __table_args__ = (
+        #  pages ordered by end date
+        Index('ix_tasks_end_date_id', 'end_date', 'id'),
+    )
     id = Column(Integer, primary_key=True)
-    owner = Column(String)
-    parent_task_id = Column(Integer, ForeignKey('tasks.id'), nullable=True)
-    assigned = Column(String, nullable=True)
+    owner = Column(String, index=True)
+    parent_task_id = Column(Integer,
+                            ForeignKey('tasks.id', ondelete='SET NULL'),
+                            nullable=True, index=True)
+    assigned = Column(String, nullable=True, index=True)
 
     name = Column(String)
     description = Column(String)
@@ -105,7 +350,7 @@ class Task(BaseModel):
     priority = Column(Enum(TaskPriority), default=TaskPriority.LOW,
                       nullable=False)
     status = Column(Enum(TaskStatus), default=TaskStatus.TODO,
-                    nullable=False)
+                    nullable=False, index=True)
 
     event = Column(Boolean, nullable=False, default=False)
     start_date = Column(DateTime)
@@ -162,6 +407,42 @@ class Task(BaseModel):
             ]))
 
 
+#  full text index of tasks name and description. sqlite only.
+#  External content table is kept in sync with tasks by triggers
+TASKS_FTS_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5("
+    "name, description, content='tasks', content_rowid='id', "
+    "prefix='2 3')",
+    "CREATE TRIGGER IF NOT EXISTS tasks_fts_insert AFTER INSERT ON tasks "
+    "BEGIN "
+    "INSERT INTO tasks_fts(rowid, name, description) "
+    "VALUES (new.id, new.name, new.description); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS tasks_fts_delete AFTER DELETE ON tasks "
+    "BEGIN "
+    "INSERT INTO tasks_fts(tasks_fts, rowid, name, description) "
+    "VALUES ('delete', old.id, old.name, old.description); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS tasks_fts_update "
+    "AFTER UPDATE OF name, description ON tasks "
+    "BEGIN "
+    "INSERT INTO tasks_fts(tasks_fts, rowid, name, description) "
+    "VALUES ('delete', old.id, old.name, old.description); "
+    "INSERT INTO tasks_fts(rowid, name, description) "
+    "VALUES (new.id, new.name, new.description); "
+    "END",
+)
+
+for statement in TASKS_FTS_DDL:
+    event.listen(Task.__table__, 'after_create',
+                 DDL(statement).execute_if(dialect='sqlite'))
+event.listen(Task.__table__, 'before_drop',
+             DDL('DROP TABLE IF EXISTS tasks_fts').execute_if(dialect='sqlite'))
+
+#  rank is bm25 relevance of matched row, lower is better
+tasks_fts = table('tasks_fts', column('rowid'), column('rank'))
+
+
 class Period(enum.Enum):
     MIN = 'Min'
     HOUR = 'Hour'
@@ -180,8 +461,9 @@ class EndType(enum.Enum):
 class Plan(BaseModel):
     __tablename__ = 'plans'
     id = Column(Integer, primary_key=True)
-    task_id = Column(Integer, ForeignKey('tasks.id'))
-    user = Column(String)
+    task_id = Column(Integer, ForeignKey('tasks.id', ondelete='CASCADE'),
+                     index=True)
+    user = Column(String, index=True)
 
     task = relationship('Task', back_populates='plan')
 
@@ -230,9 +512,16 @@ class Plan(BaseModel):
 
 class Reminder(BaseModel):
     __tablename__ = 'reminders'
+    __table_args__ = (
+        Index('ix_reminders_user_task_id', 'user', 'task_id'),
+        #  pages of user reminders
+        Index('ix_reminders_user_id', 'user', 'id'),
+        Index('ix_reminders_user_date_id', 'user', 'date', 'id'),
+    )
     id = Column(Integer, primary_key=True)
-    date = Column(DateTime)
-    task_id = Column(Integer, ForeignKey('tasks.id'))
+    date = Column(DateTime, index=True)
+    task_id = Column(Integer, ForeignKey('tasks.id', ondelete='CASCADE'),
+                     index=True)
     task = relationship('Task')
     user = Column(String)
 
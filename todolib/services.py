@@ -1,9 +1,15 @@
 """
     Module contains api for library
 """
-from typing import List
+from typing import Dict, List
 from warnings import warn
 from datetime import datetime
+from contextlib import contextmanager
+from functools import lru_cache
+
+from sqlalchemy import (select, update, delete, exists, and_, or_, true,
+                        func, case, bindparam, literal, literal_column)
+from sqlalchemy.orm import selectinload, joinedload
 
 from todolib.models import (
     Task,
@@ -15,13 +21,20 @@ from todolib.models import (
     EndType,
     task_folder_association_table,
     TaskUserRelation,
-    Reminder)
+    TaskClosure,
+    Reminder,
+    tasks_fts)
 from todolib.exceptions import (ObjectNotFoundError,
                                 RedundancyActionWarning)
 from todolib.utils import (get_end_type,
                            get_interval,
                            check_object_exist,
-                           enum_converter)
+                           enum_converter,
+                           keyset_page,
+                           fts_query,
+                           Page,
+                           TaskStats,
+                           TaskFilter)
 
 from todolib.validators import (validate_task_dates,
                                 validate_plan_end_date,
@@ -30,6 +43,217 @@ from todolib.logging import get_logger, log_decorator
 
 logger = get_logger()
 
+#  eager loading profiles of get methods, see AppService load parameter
+#  summary - relations used to print objects
+#  detail - summary and task plan, reminders
+#  tree - summary for task and all its subtasks levels
+LOAD_PROFILES = {
+    Task: {
+        'summary': (selectinload(Task.members),),
+        'detail': (selectinload(Task.members),
+                   selectinload(Task.plan),
+                   selectinload(Task.reminders)),
+        'tree': (selectinload(Task.members),
+                 selectinload(Task.subtasks, recursion_depth=-1)
+                 .selectinload(Task.members)),
+    },
+    Plan: {
+        'summary': (joinedload(Plan.task),),
+        'detail': (joinedload(Plan.task).selectinload(Task.members),),
+    },
+    Reminder: {
+        'summary': (joinedload(Reminder.task),),
+        'detail': (joinedload(Reminder.task).selectinload(Task.members),),
+    },
+}
+
+#  column projections of list methods, see AppService columns parameter
+#  list - columns rendered by objects lists
+ROW_PROFILES = {
+    Task: {
+        'list': ('id', 'name', 'start_date', 'end_date', 'status', 'priority'),
+    },
+    Plan: {
+        'list': ('id', 'task_id', 'period', 'period_amount', 'start_date',
+                 'last_activated', 'repetitions_counter'),
+    },
+    Reminder: {
+        'list': ('id', 'task_id', 'date'),
+    },
+}
+
+#  columns list methods pages might be ordered by. Every order is
+#  served by index, so pages are walked without sorting
+PAGE_ORDERS = {
+    Task: {
+        'id': Task.id,
+        'end_date': Task.end_date,
+    },
+    Plan: {
+        'id': Plan.id,
+    },
+    Reminder: {
+        'id': Reminder.id,
+        'date': Reminder.date,
+    },
+}
+DEFAULT_PAGE_SIZE = 50
+
+#  create_tasks spec fields and their defaults
+TASK_SPEC_DEFAULTS = {
+    'description': None,
+    'status': TaskStatus.TODO,
+    'priority': TaskPriority.LOW,
+    'event': False,
+    'end_date': None,
+    'parent_task_id': None,
+    'assigned': None,
+}
+TASK_SPEC_FIELDS = {'name', 'start_date', *TASK_SPEC_DEFAULTS}
+#  not null columns. None in spec means default, as in create_task
+TASK_SPEC_NOT_NULL = ('status', 'priority', 'event')
+
+#  columns task_stats can group by. folder groups by user folders ids
+STATS_GROUPS = {
+    'status': Task.status,
+    'priority': Task.priority,
+    'assigned': Task.assigned,
+    'folder': task_folder_association_table.c.folder_id,
+}
+
+#  Task fields TaskFilter conditions can use besides folder
+FILTER_FIELDS = ('id', 'name', 'description', 'owner', 'assigned', 'status',
+                 'priority', 'start_date', 'end_date', 'created', 'updated',
+                 'event', 'parent_task_id')
+
+FILTER_ENUMS = {
+    'status': (TaskStatus, 'Status'),
+    'priority': (TaskPriority, 'Priority'),
+}
+
+#  ne and not_in keep rows with null field, as python comparison does
+FILTER_OPERATORS = {
+    'eq': lambda column, value: column == value,
+    'ne': lambda column, value: column != value,
+    'in': lambda column, value: column.in_(value),
+    'not_in': lambda column, value: column.not_in(value),
+    'lt': lambda column, value: column < value,
+    'lte': lambda column, value: column <= value,
+    'gt': lambda column, value: column > value,
+    'gte': lambda column, value: column >= value,
+    'isnull': lambda column, value: (column.is_(None) if value
+                                     else column.is_not(None)),
+}
+
+#  enums are sorted in declaration order, not by stored names
+FILTER_ORDERS = dict(
+    id=Task.id,
+    name=Task.name,
+    created=Task.created,
+    updated=Task.updated,
+    start_date=Task.start_date,
+    end_date=Task.end_date,
+    status=case(*((Task.status == status, position)
+                  for position, status in enumerate(TaskStatus))),
+    priority=case(*((Task.priority == priority, position)
+                    for position, priority in enumerate(TaskPriority))))
+
+#  recursive subtree walks stop at this depth on looped hierarchies
+MAX_SUBTREE_DEPTH = 1000
+
+#  hot lookups statements. Built once, so every call only binds params
+#  and hits compiled statements cache
+GET_TASK = (select(Task)
+            .join(TaskUserRelation, TaskUserRelation.task_id == Task.id)
+            .where(TaskUserRelation.user == bindparam('user'),
+                   Task.id == bindparam('task_id')))
+GET_TASKS = (select(Task)
+             .join(TaskUserRelation, TaskUserRelation.task_id == Task.id)
+             .where(TaskUserRelation.user == bindparam('user'),
+                    Task.id.in_(bindparam('task_ids', expanding=True))))
+GET_TASK_USER_RELATION = select(TaskUserRelation).where(
+    TaskUserRelation.user == bindparam('user'),
+    TaskUserRelation.task_id == bindparam('task_id'))
+GET_FOLDER = select(Folder).where(Folder.id == bindparam('folder_id'),
+                                  Folder.user == bindparam('user'))
+GET_REMINDER = select(Reminder).where(Reminder.id == bindparam('reminder_id'),
+                                      Reminder.user == bindparam('user'))
+
+#  folders membership statements. Served by (folder_id, task_id) index
+_folder_tasks = task_folder_association_table
+FOLDER_HAS_TASK = select(exists().where(
+    _folder_tasks.c.folder_id == bindparam('folder_id'),
+    _folder_tasks.c.task_id == bindparam('task_id')))
+FOLDER_TASKS_IN = select(_folder_tasks.c.task_id).where(
+    _folder_tasks.c.folder_id == bindparam('folder_id'),
+    _folder_tasks.c.task_id.in_(bindparam('task_ids', expanding=True)))
+ADD_FOLDER_TASK = _folder_tasks.insert()
+REMOVE_FOLDER_TASKS = _folder_tasks.delete().where(
+    _folder_tasks.c.folder_id == bindparam('folder_id'),
+    _folder_tasks.c.task_id.in_(bindparam('task_ids', expanding=True)))
+CLEAR_FOLDER = _folder_tasks.delete().where(
+    _folder_tasks.c.folder_id == bindparam('folder_id'))
+
+
+def _load_options(cls, load):
+    """Returns loader options of eager loading profile"""
+    if not isinstance(load, str):
+        return load
+    try:
+        return LOAD_PROFILES[cls][load]
+    except KeyError as e:
+        raise KeyError(f'Load profile {load} not Found') from e
+
+
+@lru_cache(maxsize=None)
+def _profile_statement(statement, cls, profile):
+    """Returns statement with eager loading profile. Built once per profile"""
+    return statement.options(*_load_options(cls, profile))
+
+
+#  hierarchy index statements. Built once, executed with task_id and
+#  parent_task_id params
+_closure = TaskClosure.__table__
+_parents = _closure.alias('parents')
+_children = _closure.alias('children')
+_related = _closure.alias('related')
+
+CLOSURE_ADD = _closure.insert().values(ancestor_id=bindparam('task_id'),
+                                       descendant_id=bindparam('task_id'),
+                                       depth=0)
+#  every ancestor of parent becomes ancestor of every task descendant
+CLOSURE_ATTACH = _closure.insert().from_select(
+    ['ancestor_id', 'descendant_id', 'depth'],
+    select(_parents.c.ancestor_id,
+           _children.c.descendant_id,
+           _parents.c.depth + _children.c.depth + 1)
+    .join_from(_parents, _children, true())
+    .where(_parents.c.descendant_id == bindparam('parent_task_id'),
+           _children.c.ancestor_id == bindparam('task_id')))
+CLOSURE_DETACH = _closure.delete().where(
+    _closure.c.descendant_id.in_(
+        select(_related.c.descendant_id)
+        .where(_related.c.ancestor_id == bindparam('task_id'))),
+    _closure.c.ancestor_id.in_(
+        select(_related.c.ancestor_id)
+        .where(_related.c.descendant_id == bindparam('task_id'),
+               _related.c.ancestor_id != bindparam('task_id'))))
+#  unlinks subtrees of several tasks from strict ancestors of removed tasks
+CLOSURE_DETACH_MANY = _closure.delete().where(
+    _closure.c.descendant_id.in_(
+        select(_related.c.descendant_id)
+        .where(_related.c.ancestor_id.in_(
+            bindparam('task_ids', expanding=True)))),
+    _closure.c.ancestor_id.in_(
+        select(_related.c.ancestor_id)
+        .where(_related.c.descendant_id.in_(
+            bindparam('removed_ids', expanding=True)),
+               _related.c.ancestor_id.not_in(
+            bindparam('removed_ids', expanding=True)))))
+CLOSURE_REMOVE = _closure.delete().where(
+    or_(_closure.c.ancestor_id == bindparam('task_id'),
+        _closure.c.descendant_id == bindparam('task_id')))
+
 
 class AppService:
     """
@@ -37,6 +261,13 @@ class AppService:
     and common used methods on lib objects
     Methods contains type and logic validators
     Methods might raise exceptions or warnings.
+    Every mutating method commits its changes unless it is called
+    inside transaction block.
+    Get methods accept load parameter - LOAD_PROFILES key or loader
+    options, that loads related objects with the same few queries.
+    List methods accept columns parameter - ROW_PROFILES key or columns
+    names, that returns read only named tuple rows of these columns
+    instead of objects. Rows are not tracked by session.
     ----------
     Attributes
     ----------
@@ -48,11 +279,12 @@ class AppService:
         add_subtask - attach task with task_id as subtask of task with parent_task_id
         assign_user - assign user as task executor
         change_task_status - simply change task status
-        _change_subtasks_status - change subtasks status recursively. Calls by change_task_status method
+        _change_subtasks_status - change all subtasks levels status. Calls by change_task_status method
         create_folder - create new folder and add to storage
         create_plan - create new plan and add to storage
         create_reminder - create new reminder and add to storage
         create_task - create new task and add to storage
+        create_tasks - create many tasks with bulk inserts
         delete task - remove task and its related objects from storage
         delete_folder - delete folder from storage
         delete_obj - delete object
@@ -63,27 +295,45 @@ class AppService:
         get_all_plans - retrive plans user can access
         get_all_reminders - retrive all user reminders from storage
         get_all_folders - retrieve all user folders
+        get_ancestors - retrieve parent tasks of all levels
         get_available_tasks - retrieve tasks user can access
+        get_descendants - retrieve subtasks of all levels
         get_filtered_tasks - retrieve filtered tasks
+        filter_tasks - retrieve tasks matching TaskFilter
         get_folder - retrieve folder
         get_folder_by_name - retreive folder by its name
         get_generated_tasks_by_plan - retrive tasks created by plan
+        get_generated_tasks_by_plans - retrive tasks created by several plans
         get_obj - get any object from storage by cls and id
         get_own_plans - retrive plans created by user
         get_own_tasks - retrieve tasks created by user
         get_plan - retrive plan
         get_reminder -  retrive reminder from storage
         get_subtasks - retrieve task subtasks
+        get_subtree - retrieve task and all its subtasks levels with depth
         get_task - retrieve task from storage
+        get_tasks - retrieve several tasks by ids with single query
         get_task_by_name - retrieve case insensitive task by name matching
         get_task_reminders - retrive task reminders from storage for specific user
         get_task_user_relation - get relation between user and task
         get_user_assigned_tasks - return tasks user assignd as executor on
+        is_ancestor - check task is parent of other task on any level
+        iter_tasks - stream filtered tasks user can access
+        list_plans - retrieve page of plans user can access
+        list_reminders - retrieve page of user reminders
+        list_tasks - retrieve page of filtered tasks user can access
+        move_tasks - move several tasks from one folder to other
         populate_folder - add task in folder
+        refresh - reload object state from storage
         save_updates - save updates made out of the lib
+        search_tasks - full text search in tasks name and description
         share_task - share task with user
+        share_tasks - share several tasks with several users at once
+        task_stats - count tasks grouped by status, priority, folder or executor
+        transaction - group methods calls in one transaction
         unpopulate_folder - remove task from folder
         unshare_task - unshare task with user
+        unshare_tasks - unshare several tasks with several users at once
         update_folder - update folder info
         update_reminder - update reminder info
         update_task - update task info
@@ -93,6 +343,95 @@ class AppService:
     @log_decorator
     def __init__(self, session):
         self.session = session
+        self._transaction_level = 0
+
+    @contextmanager
+    def transaction(self):
+        """Allows to apply several methods calls in one transaction.
+           Methods called inside the block flush changes instead of commit.
+           Changes are committed on block exit or rolled back on exception.
+           Nested blocks join the outer transaction.
+
+           >>> with service.transaction():
+           ...     task = service.create_task(user, 'Report')
+           ...     service.populate_folder(user, folder.id, task.id)
+        """
+        self._transaction_level += 1
+        try:
+            yield self
+        except BaseException:
+            self._transaction_level -= 1
+            if not self._transaction_level:
+                self.session.rollback()
+            raise
+        self._transaction_level -= 1
+        if not self._transaction_level:
+            self.session.commit()
+
+    def _load(self, query, cls, load):
+        """Applies eager loading profile or loader options to query"""
+        if load is None:
+            return query
+        return query.options(*_load_options(cls, load))
+
+    def _load_statement(self, statement, cls, load):
+        """Applies eager loading profile or loader options to prebuilt
+           statement
+        """
+        if isinstance(load, str):
+            return _profile_statement(statement, cls, load)
+        if load is not None:
+            return statement.options(*load)
+        return statement
+
+    def _lookup(self, statement, cls=None, load=None, **params):
+        """Executes prebuilt lookup statement with eager loading profile
+           or loader options. Returns object or None
+        """
+        statement = self._load_statement(statement, cls, load)
+        return (self.session.execute(statement, params)
+                .unique().scalar_one_or_none())
+
+    def _columns(self, cls, columns, *required):
+        """Returns cls table columns of row profile or columns names.
+           Required columns are appended when missing
+        """
+        if isinstance(columns, str):
+            try:
+                columns = ROW_PROFILES[cls][columns]
+            except KeyError as e:
+                raise KeyError(f'Row profile {columns} not Found') from e
+        names = list(columns)
+        for column in required:
+            if column.key not in names:
+                names.append(column.key)
+        try:
+            return [cls.__table__.c[name] for name in names]
+        except KeyError as e:
+            raise KeyError(f'Column {e.args[0]} not Found') from e
+
+    def _full_text_search(self):
+        return self.session.get_bind().dialect.name == 'sqlite'
+
+    def _text_filter(self, text, column):
+        """Returns condition that matches tasks which column contains
+           words of text. Uses full text index when it is available.
+        """
+        if not self._full_text_search():
+            return getattr(Task, column).ilike(f'%{text}%')
+        match = fts_query(text, column)
+        if not match:
+            return Task.id.isnot(None)
+        return Task.id.in_(
+            select(tasks_fts.c.rowid).where(
+                literal_column('tasks_fts').op('MATCH')(match)))
+
+    def _commit(self):
+        """Commits changes or flushes them inside transaction block"""
+        if self._transaction_level:
+            self.session.flush()
+        else:
+            self.session.commit()
 
     @log_decorator
     def get_task_user_relation(self,
@@ -108,8 +447,8 @@ class AppService:
         -------
         TaskUserRelation object or None
         """
-        return self.session.query(TaskUserRelation).filter_by(
-            user=user, task_id=task_id).one_or_none()
+        return self._lookup(GET_TASK_USER_RELATION,
+                            user=user, task_id=task_id)
 
     @log_decorator
     def create_task(self,
@@ -173,28 +512,149 @@ class AppService:
                                                  task_id=task.id))
 
         self.session.add(task)
-        self.session.commit()
+        self.session.flush()
+        self._closure_add(task.id, parent_task_id)
+        self._commit()
         logger.info(f'Task ID({task.id}) created by User({user})')
         return task
 
+    @log_decorator
+    def create_tasks(self, user: str, specs) -> List[int]:
+        """Allows to create many tasks with few bulk statements.
+           Specs are validated before anything is inserted.
+        Parameters
+        ----------
+        user : str
+        specs : iterable of dict : create_task params (except user)
+        Returns
+        -------
+        List[int] : ids of created tasks in specs order
+        """
+        now = datetime.now()
+        priorities = {}
+        statuses = {}
+        rows = []
+        for index, spec in enumerate(specs):
+            unknown = set(spec).difference(TASK_SPEC_FIELDS)
+            if unknown:
+                raise ValueError(f'Task spec {index} has unknown fields '
+                                 f'{", ".join(sorted(unknown))}')
+            if 'name' not in spec:
+                raise ValueError(f'Task spec {index} has no name')
+
+            row = dict(TASK_SPEC_DEFAULTS, start_date=now)
+            row.update(spec)
+            for field in TASK_SPEC_NOT_NULL:
+                if row[field] is None:
+                    row[field] = TASK_SPEC_DEFAULTS[field]
+            priority = row['priority']
+            if isinstance(priority, str):
+                if priority not in priorities:
+                    priorities[priority] = enum_converter(
+                        priority, TaskPriority, 'Priority')
+                row['priority'] = priorities[priority]
+            status = row['status']
+            if isinstance(status, str):
+                if status not in statuses:
+                    statuses[status] = enum_converter(
+                        status, TaskStatus, 'Status')
+                row['status'] = statuses[status]
+            try:
+                validate_task_dates(row['start_date'], row['end_date'])
+            except ValueError as e:
+                raise ValueError(f'Task spec {index}: {e}') from e
+            row['owner'] = user
+            rows.append(row)
+
+        if not rows:
+            return []
+
+        parents = self.get_tasks(
+            user=user,
+            task_ids={row['parent_task_id'] for row in rows
+                      if row['parent_task_id']},
+            load=(selectinload(Task.plan),))
+        if any(parent.plan for parent in parents.values()):
+            raise ValueError('Task with plan cant have directly added subtasks')
+
+        with self.transaction():
+            #  sqlite gives every new row id larger than existing ones, so
+            #  sorted ids follow specs order. Ordered RETURNING would cost
+            #  statement per row there
+            sqlite = self.session.get_bind().dialect.name == 'sqlite'
+            ids = self.session.execute(
+                Task.__table__.insert().returning(
+                    Task.id, sort_by_parameter_order=not sqlite),
+                rows).scalars().all()
+            if sqlite:
+                ids.sort()
+
+            relations = []
+            attached = []
+            for task_id, row in zip(ids, rows):
+                relations.append({'user': user, 'task_id': task_id})
+                if row['assigned'] and row['assigned'] != user:
+                    relations.append({'user': row['assigned'],
+                                      'task_id': task_id})
+                if row['parent_task_id']:
+                    attached.append({'task_id': task_id,
+                                     'parent_task_id': row['parent_task_id']})
+            self._execute(TaskUserRelation.__table__.insert(), relations)
+            self._execute(CLOSURE_ADD, [{'task_id': task_id}
+                                        for task_id in ids])
+            if attached:
+                self._execute(CLOSURE_ATTACH, attached)
+
+        logger.info(f'{len(ids)} tasks created by User({user})')
+        return ids
+
     @log_decorator
     def get_task(self,
                  user: str,
-                 task_id: int) -> Task:
+                 task_id: int,
+                 load=None) -> Task:
         """Allows to get task object .
         Parameters
         ----------
         user : str
         task_id : int
+        load : str or loader options : eager loading profile
         Returns
         -------
         Task
         """
-        task = self.session.query(Task).join(TaskUserRelation).filter(
-            TaskUserRelation.user == user, Task.id == task_id).one_or_none()
+        task = self._lookup(GET_TASK, Task, load, user=user, task_id=task_id)
         check_object_exist(task, f'ID {task_id}', 'Task')
         return task
 
+    @log_decorator
+    def get_tasks(self, user: str, task_ids, load=None) -> Dict[int, Task]:
+        """Allows to get several tasks with single query.
+        Parameters
+        ----------
+        user : str
+        task_ids : iterable of int
+        load : str or loader options : eager loading profile
+        Returns
+        -------
+        Dict[int, Task] : tasks by their ids
+        Raises ObjectNotFoundError with all ids user cant access
+        """
+        task_ids = set(task_ids)
+        if not task_ids:
+            return {}
+        statement = self._load_statement(GET_TASKS, Task, load)
+        tasks = {task.id: task
+                 for task in self.session.execute(
+                     statement, {'user': user, 'task_ids': list(task_ids)})
+                 .unique().scalars()}
+        missing = task_ids.difference(tasks)
+        if missing:
+            raise ObjectNotFoundError(
+                'Task with params: IDs '
+                f'{", ".join(map(str, sorted(missing)))} not found')
+        return tasks
+
     @log_decorator
     def update_task(self,
                     user: str,
@@ -240,7 +700,7 @@ class AppService:
         args[Task.updated] = datetime.now()
 
         self.session.query(Task).filter_by(id=task_id).update(args)
-        self.session.commit()
+        self._commit()
 
         logger.info(f'Task ID({task.id}) updated by User({user})')
         return task
@@ -276,7 +736,7 @@ class AppService:
 
         task.assigned = user_receiver
 
-        self.session.commit()
+        self._commit()
 
         logger.info(f'User({user}) assigned as task(id={task.id}) executor')
 
@@ -308,7 +768,7 @@ class AppService:
         self.session.add(TaskUserRelation(user=user_receiver,
                                           task_id=task_id))
 
-        self.session.commit()
+        self._commit()
 
         logger.info(f'Task ID({task_id}) shared with User({user_receiver})')
 
@@ -343,38 +803,201 @@ class AppService:
             task.assigned = None
 
         self.session.delete(relation)
-        self.session.commit()
+        self._commit()
 
         logger.info(f'Task ID({task_id}) unshared with User({user_receiver})')
 
     @log_decorator
-    def get_own_tasks(self, user: str) -> List[Task]:
+    def share_tasks(self, user: str, task_ids, receivers) -> int:
+        """Share access rights to several tasks with several users.
+           Existing relations are skipped, missing ones are added with
+           single statement.
+        Parameters
+        ----------
+        user : str
+        task_ids : iterable of int
+        receivers : iterable of str : users to share tasks with
+        Returns
+        -------
+        int : amount of added relations
+        """
+        tasks = self.get_tasks(user=user, task_ids=task_ids)
+        receivers = set(receivers)
+        existing = {tuple(row) for row in self.session.execute(
+            select(TaskUserRelation.user, TaskUserRelation.task_id)
+            .where(TaskUserRelation.task_id.in_(tasks),
+                   TaskUserRelation.user.in_(receivers)))}
+        relations = [{'user': receiver, 'task_id': task_id}
+                     for task_id in sorted(tasks)
+                     for receiver in sorted(receivers)
+                     if (receiver, task_id) not in existing]
+        if not relations:
+            warn(f'Tasks already shared with users',
+                 RedundancyActionWarning)
+            return 0
+
+        #  relations added meanwhile by other connection are ignored
+        self._execute(TaskUserRelation.__table__.insert()
+                      .prefix_with('OR IGNORE', dialect='sqlite'),
+                      relations)
+        for task in tasks.values():
+            self.session.expire(task, ['members'])
+        self._commit()
+
+        logger.info(f'Tasks IDs({", ".join(map(str, sorted(tasks)))}) '
+                    f'shared with Users({", ".join(sorted(receivers))})')
+        return len(relations)
+
+    @log_decorator
+    def unshare_tasks(self, user: str, task_ids, receivers) -> int:
+        """Unshare access rights to several tasks with several users.
+           Receivers assigned as tasks executors lose assignment.
+           Missing relations are skipped.
+        Parameters
+        ----------
+        user : str : user who unshare tasks
+        task_ids : iterable of int
+        receivers : iterable of str : users that will lose access rights
+        Returns
+        -------
+        int : amount of removed relations
+        """
+        tasks = self.get_tasks(user=user, task_ids=task_ids)
+        receivers = set(receivers)
+        if any(task.owner in receivers for task in tasks.values()):
+            raise ValueError(f'User cant unshare task with its owner')
+
+        sync = {'synchronize_session': 'evaluate'}
+        self.session.execute(update(Task)
+                             .where(Task.id.in_(tasks),
+                                    Task.assigned.in_(receivers))
+                             .values(assigned=None),
+                             execution_options=sync)
+        removed = self.session.execute(
+            delete(TaskUserRelation)
+            .where(TaskUserRelation.task_id.in_(tasks),
+                   TaskUserRelation.user.in_(receivers)),
+            execution_options=sync).rowcount
+        for task in tasks.values():
+            self.session.expire(task, ['members'])
+        self._commit()
+
+        logger.info(f'Tasks IDs({", ".join(map(str, sorted(tasks)))}) '
+                    f'unshared with Users({", ".join(sorted(receivers))})')
+        return removed
+
+    @log_decorator
+    def get_own_tasks(self, user: str, load=None) -> List[Task]:
         """Method allows to get all tasks created by user.
         Parameters
         ----------
         user : str
+        load : str or loader options : eager loading profile
         Returns
         -------
         List[Task] List of Tasks
         """
-        return self.session.query(Task).filter_by(owner=user).all()
+        query = self._load(self.session.query(Task), Task, load)
+        return query.filter_by(owner=user).all()
 
     @log_decorator
-    def get_user_assigned_tasks(self, user: str) -> List[Task]:
-        return self.session.query(Task).filter_by(assigned=user).all()
+    def get_user_assigned_tasks(self, user: str, load=None) -> List[Task]:
+        query = self._load(self.session.query(Task), Task, load)
+        return query.filter_by(assigned=user).all()
 
     @log_decorator
-    def get_available_tasks(self, user: str) -> List[Task]:
+    def get_available_tasks(self, user: str, load=None) -> List[Task]:
         """Method allows to get all tasks user can access.
         Returns
         -------
         List[Task]
         """
-        return (self.session.query(Task)
+        return (self._load(self.session.query(Task), Task, load)
                 .join(TaskUserRelation)
                 .filter_by(user=user)
                 .all())
 
+    def _filter_tasks_query(self,
+                            user: str,
+                            name=None,
+                            description=None,
+                            parent_task_id=None,
+                            owner=None,
+                            assigned=None,
+                            status=None,
+                            start_date=None,
+                            end_date=None,
+                            priority=None,
+                            event=None,
+                            parentless=None,
+                            planless=None,
+                            load=None,
+                            entities=None,
+                            task_filter=None,
+                            correlated=False):
+        """Returns query of tasks user can access filtered by params.
+           See get_filtered_tasks
+           entities - columns to select instead of Task objects
+           task_filter - TaskFilter which conditions should match too
+           correlated - checks access with EXISTS instead of join,
+               so database can walk tasks index
+        """
+        if entities:
+            query = self.session.query(*entities)
+        else:
+            query = self._load(self.session.query(Task), Task, load)
+
+        if name:
+            query = query.filter(self._text_filter(name, 'name'))
+        if description:
+            query = query.filter(self._text_filter(description,
+                                                   'description'))
+
+        if owner:
+            query = query.filter(Task.owner == owner)
+        if assigned:
+            query = query.filter(Task.assigned == assigned)
+
+        if parent_task_id:
+            query = query.filter(Task.parent_task_id == parent_task_id)
+
+        if parentless:
+            query = query.filter(Task.parent_task_id == None)
+
+        if planless:
+            query = query.filter(Task.plan == None)
+
+        if priority:
+            if isinstance(priority, str):
+                priority = enum_converter(priority, TaskPriority, 'Priority')
+            query = query.filter(Task.priority == priority)
+        if status:
+            if isinstance(status, str):
+                status = enum_converter(status, TaskStatus, 'Status')
+            query = query.filter(Task.status == status)
+
+        if start_date:
+            query = query.filter(Task.start_date > start_date)
+        if end_date:
+            query = query.filter(Task.end_date < end_date)
+        if event is not None:
+            query = query.filter(Task.event == event)
+        if task_filter:
+            query = query.filter(*self._filter_conditions(user, task_filter))
+
+        if correlated:
+            return query.filter(self._accessible(user, Task.id))
+        return (query.join(TaskUserRelation)
+                .filter(TaskUserRelation.user == user))
+
+    def _accessible(self, user, task_id_column):
+        """Returns EXISTS condition served by relations (user, task_id)
+           index
+        """
+        return exists().where(TaskUserRelation.user == user,
+                              TaskUserRelation.task_id == task_id_column)
+
+    @log_decorator
     def get_filtered_tasks(self,
                            user: str,
                            name=None,
@@ -388,7 +1011,9 @@ class AppService:
                            priority=None,
                            event=None,
                            parentless=None,
-                           planless=None) -> List[Task]:
+                           planless=None,
+                           load=None,
+                           columns=None) -> List[Task]:
         """Method allow to tasks filtered by params
            start_date - from
            end_date -  till to
@@ -407,93 +1032,369 @@ class AppService:
         event : Bool
         parentless : Bool
         planless : Bool
+        load : str or loader options : eager loading profile
+        columns : str or List[str] : ROW_PROFILES key or Task columns
+            names. Returns rows of these columns instead of tasks
         Returns
         -------
         List[Task]
         """
-        query = self.session.query(Task)
-
-        if name:
-            query = query.filter(Task.name.ilike(f'%{name}%'))
-        if description:
-            query = query.filter(Task.description.ilike(f'%{description}%'))
-
-        if owner:
-            query = query.filter(Task.owner == owner)
-        if assigned:
-            query = query.filter(Task.assigned == assigned)
-
-        if parent_task_id:
-            query = query.filter(Task.parent_task_id == parent_task_id)
+        entities = self._columns(Task, columns) if columns else None
+        return self._filter_tasks_query(user=user,
+                                        name=name,
+                                        description=description,
+                                        parent_task_id=parent_task_id,
+                                        owner=owner,
+                                        assigned=assigned,
+                                        status=status,
+                                        start_date=start_date,
+                                        end_date=end_date,
+                                        priority=priority,
+                                        event=event,
+                                        parentless=parentless,
+                                        planless=planless,
+                                        load=load,
+                                        entities=entities).all()
+
+    def _filter_value(self, field, value):
+        if field not in FILTER_ENUMS:
+            return value
+        type, type_str = FILTER_ENUMS[field]
+        if isinstance(value, str):
+            return enum_converter(value, type, type_str)
+        if isinstance(value, (list, tuple, set, frozenset)):
+            return [self._filter_value(field, item) for item in value]
+        return value
+
+    def _folder_condition(self, user, operator, value):
+        membership = (select(task_folder_association_table.c.task_id)
+                      .join(Folder, Folder.id ==
+                            task_folder_association_table.c.folder_id)
+                      .where(Folder.user == user,
+                             task_folder_association_table.c.task_id ==
+                             Task.id))
+        folder_id = task_folder_association_table.c.folder_id
+        if operator == 'isnull':
+            return ~membership.exists() if value else membership.exists()
+        if operator in ('eq', 'ne'):
+            in_folder = membership.where(folder_id == value).exists()
+        elif operator in ('in', 'not_in'):
+            in_folder = membership.where(folder_id.in_(value)).exists()
+        else:
+            raise KeyError(f'Operator {operator} not Found')
+        return in_folder if operator in ('eq', 'in') else ~in_folder
+
+    def _filter_conditions(self, user, task_filter):
+        conditions = []
+        for field, operator, value in task_filter.conditions:
+            if operator not in FILTER_OPERATORS:
+                raise KeyError(f'Operator {operator} not Found')
+            if field == 'folder':
+                conditions.append(
+                    self._folder_condition(user, operator, value))
+                continue
+            if field not in FILTER_FIELDS:
+                raise KeyError(f'Field {field} not Found')
+
+            column = getattr(Task, field)
+            if operator != 'isnull':
+                value = self._filter_value(field, value)
+            condition = FILTER_OPERATORS[operator](column, value)
+            if (operator in ('ne', 'not_in')
+                    and Task.__table__.c[field].nullable):
+                condition = or_(condition, column.is_(None))
+            conditions.append(condition)
+        return conditions
+
+    def _filter_order(self, task_filter):
+        order = []
+        for key in task_filter.order_by:
+            try:
+                column = FILTER_ORDERS[key.lstrip('-')]
+            except KeyError as e:
+                raise KeyError(f'Order {key} not Found') from e
+            #  rows with null key go last in both directions
+            order.append(column.is_(None))
+            order.append(column.desc() if key.startswith('-') else column)
+        order.append(TaskUserRelation.task_id)
+        return order
 
-        if parentless:
-            query = query.filter(Task.parent_task_id == None)
+    @log_decorator
+    def filter_tasks(self,
+                     user: str,
+                     task_filter: TaskFilter,
+                     load=None,
+                     columns=None) -> List[Task]:
+        """Allows to get tasks user can access matching TaskFilter.
+           Conditions, order and limit are compiled into single query,
+           so only returned tasks are read from storage.
+        Parameters
+        ----------
+        user : str
+        task_filter : TaskFilter
+        load : str or loader options : eager loading profile
+        columns : str or List[str] : ROW_PROFILES key or Task columns
+            names. Returns rows of these columns instead of tasks
+        Returns
+        -------
+        List[Task]
+        """
+        entities = self._columns(Task, columns) if columns else None
+        query = (self._filter_tasks_query(user, load=load,
+                                          entities=entities,
+                                          task_filter=task_filter)
+                 .order_by(*self._filter_order(task_filter)))
+        if task_filter.limit is not None:
+            query = query.limit(task_filter.limit)
+        return query.all()
 
-        if planless:
-            query = query.filter(Task.plan == None)
+    @log_decorator
+    def iter_tasks(self,
+                   user: str,
+                   columns=None,
+                   batch_size=1000,
+                   **filters):
+        """Allows to walk all tasks user can access.
+           Rows are streamed from storage in batches, so memory does not
+           grow with amount of tasks. Loaded tasks are not kept in session
+           unless caller holds them.
+        Parameters
+        ----------
+        user : str
+        columns : str or List[str] : ROW_PROFILES key or Task columns
+            names. Yields plain tuples of columns values instead of Task
+            objects
+        batch_size : int : amount of rows fetched at once
+        filters : get_filtered_tasks params
+        Returns
+        -------
+        Generator of Task or tuple
+        """
+        entities = self._columns(Task, columns) if columns else None
+        query = (self._filter_tasks_query(user, entities=entities, **filters)
+                 .order_by(TaskUserRelation.task_id)
+                 .execution_options(stream_results=True)
+                 .yield_per(batch_size))
 
-        if priority:
-            if isinstance(priority, str):
-                priority = enum_converter(priority, TaskPriority, 'Priority')
-            query = query.filter(Task.priority == priority)
-        if status:
-            if isinstance(status, str):
-                status = enum_converter(status, TaskStatus, 'Status')
-            query = query.filter(Task.status == status)
+        if entities:
+            return (tuple(row) for row in query)
+        return iter(query)
 
-        if start_date:
-            query = query.filter(Task.start_date > start_date)
-        if end_date:
-            query = query.filter(Task.end_date < end_date)
-        if event is not None:
-            query = query.filter(Task.event == event)
+    def _order_column(self, cls, order_by):
+        try:
+            return PAGE_ORDERS[cls][order_by]
+        except KeyError as e:
+            raise KeyError(f'Order {order_by} not Found') from e
 
-        return (query.join(TaskUserRelation)
-                .filter(TaskUserRelation.user == user)
-                .all())
+    @log_decorator
+    def list_tasks(self,
+                   user: str,
+                   limit=DEFAULT_PAGE_SIZE,
+                   after=None,
+                   order_by='id',
+                   load=None,
+                   columns=None,
+                   **filters) -> Page:
+        """Allows to get page of tasks user can access.
+           Pages are ordered by (order_by, id) and fetched by keyset,
+           so every page costs the same.
+        Parameters
+        ----------
+        user : str
+        limit : int : page size
+        after : str : cursor of previous page
+        order_by : str : PAGE_ORDERS key
+        load : str or loader options : eager loading profile
+        columns : str or List[str] : ROW_PROFILES key or Task columns
+            names. Page contains rows of these columns, id and order
+            column instead of tasks. load is ignored
+        filters : get_filtered_tasks params or task_filter : TaskFilter
+            conditions. Page defines order and limit
+        Returns
+        -------
+        Page : tasks and cursor of next page. None on the last page
+        """
+        task_filter = filters.get('task_filter')
+        if task_filter and (task_filter.order_by or task_filter.limit):
+            raise ValueError('Page defines order and limit of tasks')
+
+        column = self._order_column(Task, order_by)
+        entities = (self._columns(Task, columns, Task.id, column)
+                    if columns else None)
+        if column is Task.id:
+            #  relations index (user, task_id) returns tasks in id order
+            query = self._filter_tasks_query(user, load=load,
+                                             entities=entities, **filters)
+            return keyset_page(query, TaskUserRelation.task_id,
+                               TaskUserRelation.task_id,
+                               order_by, limit, after)
+
+        #  tasks index (column, id) returns tasks in page order
+        query = self._filter_tasks_query(user, load=load, entities=entities,
+                                         correlated=True, **filters)
+        return keyset_page(query, column, Task.id, order_by, limit, after)
 
-    def get_tasks_by_name(self, user: str, name) -> List[Task]:
-        """Case insensitive search by name matching.
+    @log_decorator
+    def get_tasks_by_name(self, user: str, name, load=None) -> List[Task]:
+        """Case insensitive search by name words.
         Parameters
         ----------
         user : str
         name : str
+        load : str or loader options : eager loading profile
         Returns
         -------
         List[Task]
         """
-        return (self.session.query(Task)
+        return (self._load(self.session.query(Task), Task, load)
                 .join(TaskUserRelation).filter(TaskUserRelation.user == user)
-                .filter(Task.name.ilike(f'%{name}%')).all())
+                .filter(self._text_filter(name, 'name')).all())
+
+    @log_decorator
+    def task_stats(self,
+                   user: str,
+                   group_by='status',
+                   now=None,
+                   **filters):
+        """Allows to count tasks user can access with single GROUP BY query.
+        Parameters
+        ----------
+        user : str
+        group_by : str or tuple of str : STATS_GROUPS keys.
+            Task is counted in every user folder it belongs to,
+            tasks out of folders are counted in None folder.
+            Empty tuple counts all tasks once in () group
+        now : datetime : moment end dates are compared with,
+            current time by default
+        filters : get_filtered_tasks params
+        Returns
+        -------
+        dict : group value (tuple of values for several groups)
+            and its TaskStats(total, overdue)
+        """
+        keys = (group_by,) if isinstance(group_by, str) else tuple(group_by)
+        try:
+            groups = [STATS_GROUPS[key] for key in keys]
+        except KeyError as e:
+            raise KeyError(f'Group {e.args[0]} not Found') from e
+
+        overdue = and_(Task.end_date < (now or datetime.now()),
+                       Task.status.not_in((TaskStatus.DONE,
+                                           TaskStatus.ARCHIVED)))
+        query = self._filter_tasks_query(
+            user=user,
+            entities=(*groups,
+                      func.count(Task.id),
+                      func.coalesce(func.sum(case((overdue, 1),
+                                                  else_=0)), 0)),
+            **filters)
+        if 'folder' in keys:
+            folders = task_folder_association_table.c
+            query = query.outerjoin(
+                task_folder_association_table,
+                and_(folders.task_id == Task.id,
+                     folders.folder_id.in_(
+                         select(Folder.id).where(Folder.user == user))))
+
+        stats = {}
+        for *values, total, overdue_amount in query.group_by(*groups):
+            key = values[0] if isinstance(group_by, str) else tuple(values)
+            stats[key] = TaskStats(total, overdue_amount)
+        return stats
+
+    @log_decorator
+    def search_tasks(self,
+                     user: str,
+                     query: str,
+                     limit=DEFAULT_PAGE_SIZE,
+                     load=None) -> List[Task]:
+        """Full text search in tasks name and description.
+           Words are matched by prefix, quoted text as phrase.
+           Results are ordered by relevance.
+        Parameters
+        ----------
+        user : str
+        query : str : search text, e.g. 'rep "weekly meeting"'
+        limit : int
+        load : str or loader options : eager loading profile
+        Returns
+        -------
+        List[Task]
+        """
+        tasks = (self._load(self.session.query(Task), Task, load)
+                 .join(TaskUserRelation)
+                 .filter(TaskUserRelation.user == user))
+
+        if not self._full_text_search():
+            return (tasks.filter(self._text_filter(query, 'name') |
+                                 self._text_filter(query, 'description'))
+                    .order_by(Task.id).limit(limit).all())
+
+        match = fts_query(query)
+        if not match:
+            return []
+        return (tasks.join(tasks_fts, tasks_fts.c.rowid == Task.id)
+                .filter(literal_column('tasks_fts').op('MATCH')(match))
+                .order_by(tasks_fts.c.rank, Task.id)
+                .limit(limit).all())
 
     @log_decorator
     def delete_task(self,
                     user: str,
-                    task_id: int):
-        """Delete task
+                    task_id: int,
+                    recursive=False):
+        """Delete task with its relations, folders links, plan and reminders
+        using few bulk statements.
+        Subtasks of deleted task become top level tasks.
         Parameters
         ----------
         user : str : user who delete task
         task_id : int
+        recursive : Bool : delete subtasks user can access as well
         Returns
         -------
         None or Exception
         """
-        task = self.get_task(user=user, task_id=task_id)
-
-        if task.plan:
-            self.session.delete(task.plan)
-        for rel in task.members:
-            self.session.delete(rel)
-        for folder in self.get_task_folders(task_id=task.id):
-            folder.tasks.remove(task)
-        for reminder in task.reminders:
-            self.session.delete(reminder)
-
-        self.session.delete(task)
-        self.session.commit()
+        self.get_task(user=user, task_id=task_id)
 
-        logger.info(f'User({user}) deleted task ID({task_id})')
+        if recursive:
+            subtree = self._subtree_cte(user, task_id)
+            ids = self.session.execute(
+                select(subtree.c.id).distinct()).scalars().all()
+        else:
+            ids = [task_id]
+
+        orphans = self.session.execute(
+            select(Task.id).where(Task.parent_task_id.in_(ids),
+                                  Task.id.not_in(ids))).scalars().all()
+        if orphans:
+            self._execute(CLOSURE_DETACH_MANY, {'task_ids': orphans,
+                                                'removed_ids': ids})
+        self._execute(delete(TaskClosure).where(
+            or_(TaskClosure.ancestor_id.in_(ids),
+                TaskClosure.descendant_id.in_(ids))), {})
+        self._execute(delete(task_folder_association_table).where(
+            task_folder_association_table.c.task_id.in_(ids)), {})
+
+        sync = {'synchronize_session': 'evaluate'}
+        self.session.execute(update(Task)
+                             .where(Task.id.in_(orphans))
+                             .values(parent_task_id=None),
+                             execution_options=sync)
+        for model in (TaskUserRelation, Plan, Reminder):
+            self.session.execute(delete(model).where(model.task_id.in_(ids)),
+                                 execution_options=sync)
+        self.session.execute(delete(Task).where(Task.id.in_(ids)),
+                             execution_options=sync)
+
+        #  folders links were removed by core statement
+        for obj in list(self.session.identity_map.values()):
+            if isinstance(obj, Folder):
+                self.session.expire(obj, ['tasks'])
+        self._commit()
+
+        logger.info(f'User({user}) deleted task ID({task_id}) '
+                    f'with {len(ids) - 1} subtasks')
 
     @log_decorator
     def add_subtask(self,
@@ -510,24 +1411,26 @@ class AppService:
         -------
         None or Exception
         """
-        parent_task = self.get_task(user=user, task_id=parent_task_id)
-        subtask = self.get_task(user=user, task_id=task_id)
+        tasks = self.get_tasks(user=user, task_ids=(parent_task_id, task_id))
+        parent_task = tasks[parent_task_id]
+        subtask = tasks[task_id]
 
         if parent_task.plan:
             raise ValueError('Task with plan cant have directly added subtasks')
 
-        if parent_task.parent_task_id == task_id:
+        if task_id == parent_task_id:
+            raise ValueError('You cant attach task to itself')
+
+        if self.is_ancestor(task_id, parent_task_id):
             raise ValueError('Loop dependecy error. You cant add parent task as subtask')
 
         if subtask.parent_task_id:
             raise ValueError('Task already have parent task')
 
-        if task_id == parent_task_id:
-            raise ValueError('You cant attach task to itself')
-
         subtask.parent_task_id = parent_task_id
+        self._closure_attach(task_id, parent_task_id)
 
-        self.session.commit()
+        self._commit()
 
         logger.info(
             f'User({user}) added Task(ID{task_id}) as the subtask of Task ID({parent_task_id})')
@@ -549,19 +1452,110 @@ class AppService:
             raise ValueError('Task dont have parent task')
         else:
             subtask.parent_task_id = None
+            self._closure_detach(task_id)
 
-        self.session.commit()
+        self._commit()
 
         logger.info(
             f'User({user}) removed Task(ID{task_id}) from subtasks of Task ID({subtask.parent_task_id})')
 
+    def _execute(self, statement, params):
+        """Executes core statement that neither affects loaded objects
+           nor depends on their pending changes
+        """
+        with self.session.no_autoflush:
+            return self.session.execute(statement, params)
+
+    def _closure_add(self, task_id: int, parent_task_id=None):
+        """Adds task to hierarchy index as leaf of parent task"""
+        self._execute(CLOSURE_ADD, {'task_id': task_id})
+        if parent_task_id:
+            self._closure_attach(task_id, parent_task_id)
+
+    def _closure_attach(self, task_id: int, parent_task_id: int):
+        """Links task and its subtasks with parent task and its ancestors"""
+        self._execute(CLOSURE_ATTACH, {'task_id': task_id,
+                                       'parent_task_id': parent_task_id})
+
+    def _closure_detach(self, task_id: int):
+        """Unlinks task and its subtasks from task ancestors"""
+        self._execute(CLOSURE_DETACH, {'task_id': task_id})
+
+    @log_decorator
+    def is_ancestor(self, task_id: int, descendant_id: int) -> bool:
+        """Checks whether task is parent of descendant on any level.
+        Parameters
+        ----------
+        task_id : int
+        descendant_id : int
+        Returns
+        -------
+        Bool
+        """
+        return self.session.query(
+            self.session.query(TaskClosure)
+            .filter(TaskClosure.ancestor_id == task_id,
+                    TaskClosure.descendant_id == descendant_id,
+                    TaskClosure.depth > 0)
+            .exists()).scalar()
+
+    @log_decorator
+    def get_descendants(self, user: str, task_id: int,
+                        max_depth=None, load=None) -> List[Task]:
+        """Allows to get subtasks of all levels user can access.
+        Parameters
+        ----------
+        user : str
+        task_id : int
+        max_depth : int : 1 returns only direct subtasks
+        load : str or loader options : eager loading profile
+        Returns
+        -------
+        List[Task] : ordered by depth
+        """
+        query = (self._load(self.session.query(Task), Task, load)
+                 .join(TaskClosure, TaskClosure.descendant_id == Task.id)
+                 .filter(TaskClosure.ancestor_id == task_id,
+                         TaskClosure.depth > 0))
+        if max_depth is not None:
+            query = query.filter(TaskClosure.depth <= max_depth)
+        return (query.join(TaskUserRelation,
+                           TaskUserRelation.task_id == Task.id)
+                .filter(TaskUserRelation.user == user)
+                .order_by(TaskClosure.depth, Task.id)
+                .all())
+
     @log_decorator
-    def get_subtasks(self, user: str, task_id: int):
+    def get_ancestors(self, user: str, task_id: int,
+                      load=None) -> List[Task]:
+        """Allows to get parent tasks of all levels user can access.
+        Parameters
+        ----------
+        user : str
+        task_id : int
+        load : str or loader options : eager loading profile
+        Returns
+        -------
+        List[Task] : direct parent goes first
+        """
+        return (self._load(self.session.query(Task), Task, load)
+                .join(TaskClosure, TaskClosure.ancestor_id == Task.id)
+                .filter(TaskClosure.descendant_id == task_id,
+                        TaskClosure.depth > 0)
+                .join(TaskUserRelation,
+                      TaskUserRelation.task_id == Task.id)
+                .filter(TaskUserRelation.user == user)
+                .order_by(TaskClosure.depth)
+                .all())
+
+    @log_decorator
+    def get_subtasks(self, user: str, task_id: int, load=None):
         """Allows to get task subtasks.
         Parameters
         ----------
         user : str
         task_id : int
+        load : str or loader options : eager loading profile
         Returns
         -------
         Task[List] or Exception
@@ -569,15 +1563,71 @@ class AppService:
 
         task = self.get_task(user=user, task_id=task_id)
 
-        return self.session.query(Task).filter_by(
+        query = self._load(self.session.query(Task), Task, load)
+        return query.filter_by(
             parent_task_id=task_id).join(
                 TaskUserRelation).filter_by(user=user).all()
 
+    def _subtree_cte(self, user: str, task_id: int):
+        """Returns recursive CTE of (id, depth) of task and subtasks user
+           can access. Subtasks of inaccessible task are not included.
+           Walk stops at MAX_SUBTREE_DEPTH, so looped hierarchy returns
+           its tasks several times instead of never ending.
+        """
+        subtree = (select(Task.id.label('id'), literal(0).label('depth'))
+                   .where(Task.id == task_id)
+                   .cte('subtree', recursive=True))
+        subtasks = (select(Task.id, subtree.c.depth + 1)
+                    .join(subtree, Task.parent_task_id == subtree.c.id)
+                    .join(TaskUserRelation,
+                          TaskUserRelation.task_id == Task.id)
+                    .where(TaskUserRelation.user == user,
+                           subtree.c.depth < MAX_SUBTREE_DEPTH))
+        return subtree.union_all(subtasks)
+
+    @log_decorator
+    def get_subtree(self, user: str, task_id: int, load=None):
+        """Allows to get task and all its subtasks levels in one query.
+        Parameters
+        ----------
+        user : str
+        task_id : int
+        load : str or loader options : eager loading profile
+        Returns
+        -------
+        List[(Task, int)] : tasks and their depth. Task goes first,
+            every subtask goes after its parent
+        """
+        self.get_task(user=user, task_id=task_id)
+        subtree = self._subtree_cte(user, task_id)
+        rows = (self._load(self.session.query(Task, subtree.c.depth),
+                           Task, load)
+                .join(subtree, subtree.c.id == Task.id)
+                .order_by(subtree.c.depth, Task.id)
+                .all())
+
+        children = {}
+        seen = {rows[0][0].id}
+        for task, depth in rows[1:]:
+            #  rows are ordered by depth, looped tasks repeat deeper
+            if task.id in seen:
+                continue
+            seen.add(task.id)
+            children.setdefault(task.parent_task_id, []).append((task, depth))
+        result = []
+        stack = [rows[0]]
+        while stack:
+            task, depth = stack.pop()
+            result.append((task, depth))
+            stack.extend(reversed(children.get(task.id, [])))
+        return result
+
     def _change_subtasks_status(self,
                                 user: str,
                                 task_id: int,
                                 status: TaskStatus):
-        """Inner method that allow to change tasks status.
+        """Inner method that allow to change status of all task subtasks
+           user can access with single update.
            Dont call this explicit or call save_updates to commit changes
         Parameters
         ----------
@@ -587,13 +1637,12 @@ class AppService:
         Returns
         -------
         """
-        task = self.get_task(user, task_id)
-        for subtask in task.subtasks:
-            subtask.status = status
-            subtask.updated = datetime.now()
-            self._change_subtasks_status(user=user,
-                                         task_id=subtask.id,
-                                         status=status)
+        subtree = self._subtree_cte(user, task_id)
+        (self.session.query(Task)
+         .filter(Task.id.in_(select(subtree.c.id)
+                             .where(subtree.c.depth > 0)))
+         .update({Task.status: status, Task.updated: datetime.now()},
+                 synchronize_session='fetch'))
 
     @log_decorator
     def change_task_status(self,
@@ -625,7 +1674,7 @@ class AppService:
                                          task_id=task_id,
                                          status=status)
 
-        self.session.commit()
+        self._commit()
 
         logger.info(
             f'User({user}) has changed Task(ID{task_id}) status to {task.status.value})')
@@ -645,7 +1694,7 @@ class AppService:
         folder = Folder(user=user, name=name)
 
         self.session.add(folder)
-        self.session.commit()
+        self._commit()
 
         logger.info(f'Folder ID({folder.id}) created by User({user})')
 
@@ -653,8 +1702,7 @@ class AppService:
 
     @log_decorator
     def get_folder(self, user: str, folder_id: int) -> Folder:
-        folder = self.session.query(Folder).filter_by(
-            id=folder_id, user=user).one_or_none()
+        folder = self._lookup(GET_FOLDER, user=user, folder_id=folder_id)
         check_object_exist(folder,
                            f'id : {folder_id}',
                            'Folder')
@@ -676,7 +1724,7 @@ class AppService:
 
         folder.name = name
 
-        self.session.commit()
+        self._commit()
 
         logger.info(f'Folder ID({folder.id}) updated by User({user})')
         return folder
@@ -685,11 +1733,11 @@ class AppService:
     def delete_folder(self, user: str, folder_id: int):
         folder = self.get_folder(user, folder_id)
 
-        for task in folder.tasks:
-            folder.tasks.remove(task)
-
-        self.session.delete(folder)
-        self.session.commit()
+        self._execute(CLEAR_FOLDER, {'folder_id': folder_id})
+        self.session.execute(delete(Folder).where(Folder.id == folder.id),
+                             execution_options={
+                                 'synchronize_session': 'evaluate'})
+        self._commit()
 
         logger.info(
             f'Folder ID({folder_id}) deleted by User({user})')
@@ -713,15 +1761,16 @@ class AppService:
         -------
         """
         folder = self.get_folder(user, folder_id)
-        task = self.get_task(user, task_id)
-        if task in folder.tasks:
+        self.get_task(user, task_id)
+        if self._folder_has_task(folder_id, task_id):
             warn(f'Folder already have this task',
                  RedundancyActionWarning)
             return
 
-        folder.tasks.append(task)
-
-        self.session.commit()
+        self._execute(ADD_FOLDER_TASK, {'folder_id': folder_id,
+                                        'task_id': task_id})
+        self.session.expire(folder, ['tasks'])
+        self._commit()
 
         logger.info(
             f'Folder ID({task_id}) populated with Task({task_id}) by User({user})')
@@ -742,16 +1791,73 @@ class AppService:
         """
         folder = self.get_folder(user, folder_id)
         task = self.get_task(user, task_id)
-        if task not in folder.tasks:
+        if not self._folder_has_task(folder_id, task_id):
             raise ValueError(f'Folder dont have this task')
 
-        folder.tasks.remove(task)
-
-        self.session.commit()
+        self._execute(REMOVE_FOLDER_TASKS, {'folder_id': folder_id,
+                                            'task_ids': [task_id]})
+        self.session.expire(folder, ['tasks'])
+        self._commit()
 
         logger.info(
             f'Task({task_id}) removed from Folder ID({task.id}) by User({user})')
 
+    def _folder_has_task(self, folder_id: int, task_id: int) -> bool:
+        return self._execute(FOLDER_HAS_TASK, {'folder_id': folder_id,
+                                               'task_id': task_id}).scalar()
+
+    @log_decorator
+    def move_tasks(self,
+                   user: str,
+                   task_ids,
+                   from_folder_id: int,
+                   to_folder_id: int) -> int:
+        """Method moves several tasks from one folder to other with
+           few bulk statements. Tasks already in target folder
+           are only removed from source folder.
+        Parameters
+        ----------
+        user : str
+        task_ids : iterable of int
+        from_folder_id : int
+        to_folder_id : int
+        Returns
+        -------
+        int : amount of moved tasks
+        """
+        from_folder = self.get_folder(user, from_folder_id)
+        to_folder = self.get_folder(user, to_folder_id)
+        task_ids = sorted(self.get_tasks(user=user, task_ids=task_ids))
+        if not task_ids:
+            return 0
+        if from_folder_id == to_folder_id:
+            warn(f'Tasks already in this folder', RedundancyActionWarning)
+            return 0
+
+        present = set(self._execute(FOLDER_TASKS_IN,
+                                    {'folder_id': from_folder_id,
+                                     'task_ids': task_ids}).scalars())
+        if len(present) != len(task_ids):
+            raise ValueError(f'Folder dont have this task')
+
+        in_target = set(self._execute(FOLDER_TASKS_IN,
+                                      {'folder_id': to_folder_id,
+                                       'task_ids': task_ids}).scalars())
+        self._execute(REMOVE_FOLDER_TASKS, {'folder_id': from_folder_id,
+                                            'task_ids': task_ids})
+        added = [{'folder_id': to_folder_id, 'task_id': task_id}
+                 for task_id in task_ids if task_id not in in_target]
+        if added:
+            self._execute(ADD_FOLDER_TASK, added)
+        self.session.expire(from_folder, ['tasks'])
+        self.session.expire(to_folder, ['tasks'])
+        self._commit()
+
+        logger.info(f'Tasks IDs({", ".join(map(str, task_ids))}) moved from '
+                    f'Folder ID({from_folder_id}) to Folder ID({to_folder_id}) '
+                    f'by User({user})')
+        return len(task_ids)
+
     @log_decorator
     def create_plan(self, user: str, task_id: int,
                     period_amount: int,
@@ -801,7 +1907,7 @@ class AppService:
                     start_date=start_date)
 
         self.session.add(plan)
-        self.session.commit()
+        self._commit()
 
         logger.info(f'Plan({plan.id}) created by User({user})')
 
@@ -820,29 +1926,81 @@ class AppService:
         return plan
 
     @log_decorator
-    def get_all_plans(self, user: str) -> List[Plan]:
-        return self.session.query(Plan).join(Task).join(
+    def get_all_plans(self, user: str, load=None) -> List[Plan]:
+        query = self._load(self.session.query(Plan), Plan, load)
+        return query.join(Task).join(
             TaskUserRelation).filter(
             TaskUserRelation.user == user).all()
 
     @log_decorator
-    def get_own_plans(self, user: str) ->Plan:
-        return self.session.query(Plan).filter_by(user=user).all()
+    def list_plans(self,
+                   user: str,
+                   limit=DEFAULT_PAGE_SIZE,
+                   after=None,
+                   order_by='id',
+                   load=None,
+                   columns=None) -> Page:
+        """Allows to get page of plans user can access.
+           See list_tasks
+        Returns
+        -------
+        Page
+        """
+        column = self._order_column(Plan, order_by)
+        if columns:
+            query = self.session.query(
+                *self._columns(Plan, columns, Plan.id, column))
+        else:
+            query = self._load(self.session.query(Plan), Plan, load)
+        #  plans are walked in id order, access is checked per plan
+        query = query.filter(self._accessible(user, Plan.task_id))
+        return keyset_page(query, column, Plan.id, order_by, limit, after)
+
+    @log_decorator
+    def get_own_plans(self, user: str, load=None) ->Plan:
+        query = self._load(self.session.query(Plan), Plan, load)
+        return query.filter_by(user=user).all()
 
     @log_decorator
     def get_generated_tasks_by_plan(self, user: str,
-                                    plan_id: int) -> List[Task]:
+                                    plan_id: int,
+                                    load=None) -> List[Task]:
         """Return all tasks created by Plan
         ----------
         user : str
         plan_id : int
+        load : str or loader options : eager loading profile
         Returns
         -------
         List[Task]
         """
         plan = self.get_plan(user=user, plan_id=plan_id)
-        return self.session.query(Task).filter(
-            Task.parent_task_id == plan.task_id).join(TaskUserRelation).all()
+        return self.get_generated_tasks_by_plans(user, [plan],
+                                                 load=load)[plan.id]
+
+    @log_decorator
+    def get_generated_tasks_by_plans(self, user: str, plans,
+                                     load=None) -> Dict[int, List[Task]]:
+        """Allows to get tasks created by several plans with single query.
+        Parameters
+        ----------
+        user : str
+        plans : List[Plan] : plans user can access
+        load : str or loader options : eager loading profile
+        Returns
+        -------
+        Dict[int, List[Task]] : plan id and tasks created by plan
+        """
+        plan_ids = {plan.task_id: plan.id for plan in plans}
+        tasks = {plan.id: [] for plan in plans}
+        query = (self._load(self.session.query(Task), Task, load)
+                 .join(TaskUserRelation)
+                 .filter(TaskUserRelation.user == user,
+                         Task.parent_task_id.in_(plan_ids))
+                 .order_by(Task.id))
+        for task in query:
+            tasks[plan_ids[task.parent_task_id]].append(task)
+        return tasks
 
     @log_decorator
     def get_active_plans(self, user: str, plans=None) -> List[Plan]:
@@ -906,40 +2064,45 @@ class AppService:
             active_plans = self.get_active_plans(user)
         if not active_plans:
             return
-        for plan in active_plans:
-            interval = get_interval(plan.period, plan.period_amount)
-            near_activation = plan.last_activated + interval
-
-            while near_activation < datetime.now():
-
-                if (plan.end_type == EndType.AMOUNT and
-                        plan.repetitions_counter == plan.repetitions_amount):
-                    break
-                if (plan.end_type == EndType.DATE and
-                        near_activation > plan.end_date):
-                    break
-
-                task = self.create_task(user=user,
-                                        name=plan.task.name,
-                                        description=plan.task.description,
-                                        start_date=near_activation,
-                                        event=plan.task.event,
-                                        assigned=plan.task.assigned)
-
-                task.parent_task_id = plan.task.id
-
-                plan.last_activated = near_activation
+        #  plans tasks and their members are loaded with two queries
+        #  instead of two lazy loads per plan
+        self.get_tasks(user=user,
+                       task_ids={plan.task_id for plan in active_plans},
+                       load='summary')
+        with self.transaction():
+            for plan in active_plans:
+                interval = get_interval(plan.period, plan.period_amount)
                 near_activation = plan.last_activated + interval
-                plan.repetitions_counter += 1
-                for x in plan.task.members:
-                    if x.user != user and x.user != plan.task.assigned:
-                        task.members.append(
-                            TaskUserRelation(user=x.user,
-                                             task_id=task.id))
 
-                self.session.add(task)
+                while near_activation < datetime.now():
+
+                    if (plan.end_type == EndType.AMOUNT and
+                            plan.repetitions_counter == plan.repetitions_amount):
+                        break
+                    if (plan.end_type == EndType.DATE and
+                            near_activation > plan.end_date):
+                        break
+
+                    task = self.create_task(user=user,
+                                            name=plan.task.name,
+                                            description=plan.task.description,
+                                            start_date=near_activation,
+                                            event=plan.task.event,
+                                            assigned=plan.task.assigned)
+
+                    task.parent_task_id = plan.task.id
+                    self._closure_attach(task.id, plan.task.id)
+
+                    plan.last_activated = near_activation
+                    near_activation = plan.last_activated + interval
+                    plan.repetitions_counter += 1
+                    for x in plan.task.members:
+                        if x.user != user and x.user != plan.task.assigned:
+                            task.members.append(
+                                TaskUserRelation(user=x.user,
+                                                 task_id=task.id))
 
-        self.session.commit()
+                    self.session.add(task)
 
         logger.info(
             f'({len(active_plans)}) Plans were executed. Tasks related to plan created')
@@ -948,7 +2111,7 @@ class AppService:
     def delete_plan(self, user: str, plan_id: int):
         plan = self.get_plan(user, plan_id)
         self.session.delete(plan)
-        self.session.commit()
+        self._commit()
 
     @log_decorator
     def update_plan(self, user: str,
@@ -986,12 +2149,13 @@ class AppService:
                                            args[Plan.repetitions_amount])
 
         self.session.query(Plan).filter_by(id=plan_id).update(args)
-        self.session.commit()
+        self._commit()
 
         logger.info(f'Plan({plan.id}) updated by User({user})')
 
         return self.session.query(Plan).get(plan_id)
 
+    @log_decorator
     def create_reminder(self, user, task_id, date):
 
         task = self.get_task(user=user, task_id=task_id)
@@ -1001,27 +2165,55 @@ class AppService:
         reminder = Reminder(task_id=task_id, date=date, user=user)
 
         self.session.add(reminder)
-        self.session.commit()
+        self._commit()
 
         logger.info(f'Reminder({reminder.id}) created by User({user})')
 
         return reminder
 
+    @log_decorator
     def get_reminder(self, user: str, reminder_id: int):
-        reminder = self.session.query(Reminder).filter_by(user=user,
-                                                          id=reminder_id).one_or_none()
+        reminder = self._lookup(GET_REMINDER, user=user,
+                                reminder_id=reminder_id)
         check_object_exist(reminder,
                            f'id : {reminder_id}',
                            'Reminder')
         return reminder
 
-    def get_all_reminders(self, user: str):
-        return self.session.query(Reminder).filter_by(user=user).all()
+    @log_decorator
+    def get_all_reminders(self, user: str, load=None):
+        query = self._load(self.session.query(Reminder), Reminder, load)
+        return query.filter_by(user=user).all()
 
-    def get_task_reminders(self, user: str, task_id: int):
-        return self.session.query(Reminder).filter_by(user=user,
-                                                      task_id=task_id).all()
+    @log_decorator
+    def list_reminders(self,
+                       user: str,
+                       limit=DEFAULT_PAGE_SIZE,
+                       after=None,
+                       order_by='id',
+                       load=None,
+                       columns=None) -> Page:
+        """Allows to get page of user reminders.
+           See list_tasks
+        Returns
+        -------
+        Page
+        """
+        column = self._order_column(Reminder, order_by)
+        if columns:
+            query = self.session.query(
+                *self._columns(Reminder, columns, Reminder.id, column))
+        else:
+            query = self._load(self.session.query(Reminder), Reminder, load)
+        query = query.filter(Reminder.user == user)
+        return keyset_page(query, column, Reminder.id, order_by, limit, after)
+
+    @log_decorator
+    def get_task_reminders(self, user: str, task_id: int, load=None):
+        query = self._load(self.session.query(Reminder), Reminder, load)
+        return query.filter_by(user=user, task_id=task_id).all()
 
+    @log_decorator
     def update_reminder(self, user: str,
                         reminder_id: int,
                         task_id=None,
@@ -1032,19 +2224,20 @@ class AppService:
             validate_reminder_date(date)
             reminder.date = date
 
-        self.session.commit()
+        self._commit()
 
         logger.info(f'Reminder({reminder.id}) updated by User({user})')
 
         return reminder
 
+    @log_decorator
     def delete_reminder(self, user: str,
                         reminder_id: int):
 
         reminder = self.get_reminder(user, reminder_id)
 
         self.session.delete(reminder)
-        self.session.commit()
+        self._commit()
 
         logger.info(f'Reminder({reminder.id}) deleted by User({user})')
 
@@ -1068,10 +2261,26 @@ class AppService:
     @log_decorator
     def delete_obj(self, obj):
         self.session.delete(obj)
-        self.session.commit()
+        self._commit()
+
+    @log_decorator
+    def refresh(self, obj, *attributes):
+        """Allows to reload object state from storage.
+           Use it when session keeps objects state after commit
+           (expire_on_commit=False) and object could be changed outside.
+        Parameters
+        ----------
+        obj : Model
+        attributes : str : attributes to reload. All by default
+        Returns
+        -------
+        Model
+        """
+        self.session.refresh(obj, list(attributes) or None)
+        return obj
 
     @log_decorator
     def save_updates(self):
         """Allow to commit updates made out of the lib.
         """
-        self.session.commit()
+        self._commit()
@@ -2,11 +2,28 @@
     Module contains utils methods used by library
 """
 
+from base64 import urlsafe_b64encode, urlsafe_b64decode
+from collections import namedtuple
+from datetime import datetime
+import json
+import re
+
 from dateutil.relativedelta import relativedelta
+from sqlalchemy import tuple_
 
 from todolib.models import EndType, Period
 from todolib.exceptions import ObjectNotFoundError
 
+#  quoted phrase or single word of search text
+SEARCH_TERM = re.compile(r'"([^"]*)"|([^\s"]+)')
+
+#  page of keyset pagination. cursor is None on the last page
+Page = namedtuple('Page', ['items', 'cursor'])
+
+#  tasks amount of stats group. overdue tasks are not done nor archived
+#  and their end date passed
+TaskStats = namedtuple('TaskStats', ['total', 'overdue'])
+
 
 def check_object_exist(obj, params, type):
     """
@@ -71,3 +88,147 @@ def get_end_type(start_date, period_type, period_amount,
     if repetitions_amount:
         return EndType.AMOUNT
     return EndType.NEVER
+
+
+def encode_cursor(order_by, value, id):
+    """
+    Allows to build opaque cursor that points after object with
+    specified order value and id.
+    """
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    data = json.dumps([order_by, value, id]).encode()
+    return urlsafe_b64encode(data).decode()
+
+
+def decode_cursor(cursor, order_by, column):
+    """
+    Returns order value and id stored in cursor.
+    Throws ValueError if cursor is malformed or built for other order.
+    """
+    try:
+        cursor_order_by, value, id = json.loads(
+            urlsafe_b64decode(cursor.encode()))
+        python_type = column.type.python_type
+        if type(id) is not int:
+            raise TypeError('Cursor id should be integer')
+        if value is not None:
+            if python_type is datetime:
+                value = datetime.fromisoformat(value)
+            elif type(value) is not python_type:
+                raise TypeError(f'Cursor value should be {python_type}')
+    except (ValueError, TypeError) as e:
+        raise ValueError('Invalid cursor') from e
+    if cursor_order_by != order_by:
+        raise ValueError(f'Cursor is not valid for order by {order_by}')
+    return value, id
+
+
+def keyset_page(query, column, id_column, order_by, limit, after=None):
+    """
+    Allows to get page of query ordered by (column, id_column).
+    id_column is objects id or column equal to it, e.g. foreign key
+    of joined table, that lets database walk the index in order.
+    Rows with null column go last: non null range is walked first,
+    then null rows by id. Both ranges are index ranges, so page
+    starts right after the cursor row and every page costs the same
+    without OFFSET or sorting.
+    """
+    if limit < 1:
+        raise ValueError('Limit should be positive number')
+
+    value = last_id = None
+    if after:
+        value, last_id = decode_cursor(after, order_by, column)
+
+    if column is id_column:
+        if after:
+            query = query.filter(id_column > last_id)
+        items = query.order_by(id_column).limit(limit + 1).all()
+    else:
+        items = []
+        if value is not None or not after:
+            ordered = query.filter(column.is_not(None))
+            if after:
+                ordered = ordered.filter(
+                    tuple_(column, id_column) > tuple_(value, last_id))
+            items = (ordered.order_by(column, id_column)
+                     .limit(limit + 1).all())
+        if len(items) <= limit:
+            nulls = query.filter(column.is_(None))
+            if after and value is None:
+                nulls = nulls.filter(id_column > last_id)
+            items += (nulls.order_by(id_column)
+                      .limit(limit + 1 - len(items)).all())
+
+    if len(items) <= limit:
+        return Page(items, None)
+
+    items = items[:limit]
+    last = items[-1]
+    value = last.id if column is id_column else getattr(last, column.key)
+    return Page(items, encode_cursor(order_by, value, last.id))
+
+
+def fts_query(text, column=None):
+    """
+    Allows to convert user search text to FTS5 query.
+    Quoted parts are searched as phrases, other words as prefixes.
+    All terms should match. Returns empty string if text has no terms.
+    """
+    terms = []
+    for phrase, word in SEARCH_TERM.findall(text):
+        if phrase.strip():
+            terms.append('"{}"'.format(phrase))
+        elif word:
+            terms.append('"{}"*'.format(word))
+    if not terms or column is None:
+        return ' '.join(terms)
+    return f'{column} : ({" ".join(terms)})'
+
+
+class TaskFilter:
+    """
+    Allows to describe tasks selection compiled into single SQL query
+    by AppService.filter_tasks. Conditions are field__operator=value
+    keywords, field=value means equality:
+
+        TaskFilter(status__not_in=[TaskStatus.DONE, TaskStatus.ARCHIVED],
+                   end_date__lt=datetime.now(),
+                   parent_task_id__isnull=True,
+                   folder=folder_id,
+                   order_by=('-priority', 'end_date'),
+                   limit=10)
+
+    Operators: eq, ne, in, not_in, lt, lte, gt, gte, isnull.
+    folder field checks membership in user folders.
+    order_by keys prefixed with '-' sort in descending order.
+    Filters are combined with &, conditions of both should match,
+    order and limit of right filter win if set.
+    """
+
+    def __init__(self, order_by=(), limit=None, **conditions):
+        if limit is not None and limit < 1:
+            raise ValueError('Limit should be positive number')
+        if isinstance(order_by, str):
+            order_by = (order_by,)
+
+        self.order_by = tuple(order_by)
+        self.limit = limit
+        self.conditions = []
+        for key, value in conditions.items():
+            field, _, operator = key.partition('__')
+            self.conditions.append((field, operator or 'eq', value))
+
+    def __and__(self, other):
+        combined = TaskFilter(order_by=other.order_by or self.order_by,
+                              limit=(other.limit if other.limit is not None
+                                     else self.limit))
+        combined.conditions = self.conditions + other.conditions
+        return combined
+
+    def __repr__(self):
+        conditions = ', '.join(f'{field}__{operator}={value!r}'
+                               for field, operator, value in self.conditions)
+        return (f'TaskFilter({conditions}, order_by={self.order_by}, '
+                f'limit={self.limit})')
@@ -1,10 +1,12 @@
-
 from django.conf import settings
 from todolib.services import AppService
-from todolib.models import set_up_connection
+from todolib.models import registry
+
 
 def get_service():
-    session = set_up_connection('sqlite',
-                                settings.DATABASES['default']['NAME'])
+    session = registry.get_session('sqlite',
+                                   settings.DATABASES['default']['NAME'],
+                                   expire_on_commit=settings.TODOLIB_EXPIRE_ON_COMMIT,
+                                   **settings.TODOLIB_ENGINE_OPTIONS)
     service = AppService(session)
     return service
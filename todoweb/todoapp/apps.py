@@ -1,5 +1,11 @@
 from django.apps import AppConfig
+from django.conf import settings
+
+from todolib.logging import setup_lib_logging
 
 
 class TodoappConfig(AppConfig):
     name = 'todoapp'
+
+    def ready(self):
+        setup_lib_logging(**settings.TODOLIB_LOGGING)
@@ -81,7 +81,7 @@ class SubTaskForm(forms.Form):
 
 class MemberForm(forms.Form):
 
-    member = forms.ModelChoiceField(User.objects.all(), required=True)
+    members = forms.ModelMultipleChoiceField(User.objects.all(), required=True)
 
 
 class PlanForm(forms.Form):
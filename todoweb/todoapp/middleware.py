@@ -0,0 +1,27 @@
+from todolib.models import registry
+from todolib import metrics
+
+
+class LibSessionMiddleware:
+    """
+    Closes library sessions opened during request.
+    Keeps one session per request and returns its connection to the pool.
+    With queries tracking statements of the view are attributed to it.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            return self.get_response(request)
+        finally:
+            scope = getattr(request, 'lib_query_scope', None)
+            if scope is not None:
+                metrics.registry.close_scope(scope)
+            registry.remove_sessions()
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if metrics.registry.track_queries:
+            request.lib_query_scope = metrics.registry.open_scope(
+                f'view.{view_func.__name__}')
@@ -7,6 +7,7 @@ from django.contrib.auth.models import User
 from functools import wraps
 
 from todolib.models import TaskStatus
+from todolib.utils import TaskFilter
 
 from todolib.exceptions import ObjectNotFoundError, LibError
 from todoapp import get_service
@@ -18,6 +19,9 @@ from .forms import (TaskForm,
                     ReminderForm,
                     TaskSearchForm)
 
+#  tasks shown in lists, archived ones have own list
+ACTIVE_TASKS = TaskFilter(status__ne=TaskStatus.ARCHIVED)
+
 
 def execute_plans(func):
     def wrapper(request, *args, **kwargs):
@@ -37,6 +41,27 @@ def error_catcher(func):
     return wrapper
 
 
+def get_page(request, list_method, **kwargs):
+    """Returns page of list method results after cursor from query string.
+    Invalid cursor shows the first page.
+    """
+    kwargs.setdefault('limit', settings.TODOLIB_PAGE_SIZE)
+    try:
+        return list_method(after=request.GET.get('after'), **kwargs)
+    except ValueError:
+        return list_method(**kwargs)
+
+
+def get_stats(service, user):
+    """Returns tasks amount by status and overdue tasks amount
+    for tasks list summary widget
+    """
+    stats = service.task_stats(user=user)
+    return {'statuses': [(status.value, stats[status].total)
+                         for status in TaskStatus if status in stats],
+            'overdue': sum(item.overdue for item in stats.values())}
+
+
 def index(request):
     return render(request, 'index.html')
 
@@ -134,27 +159,29 @@ def add_task(request):
     if request.method == 'POST':
         form = TaskForm(user, request.POST)
         if form.is_valid():
+            service = get_service()
             try:
-                service = get_service()
-                task = service.create_task(user=user,
-                                           name=form.cleaned_data['name'],
-                                           description=form.cleaned_data['description'],
-                                           priority=form.cleaned_data['priority'],
-                                           status=form.cleaned_data['status'],
-                                           event=form.cleaned_data['event'],
-                                           start_date=form.cleaned_data['start_date'],
-                                           end_date=form.cleaned_data['end_date'],
-                                           assigned=form.cleaned_data['assigned'])
+                with service.transaction():
+                    task = service.create_task(user=user,
+                                               name=form.cleaned_data['name'],
+                                               description=form.cleaned_data['description'],
+                                               priority=form.cleaned_data['priority'],
+                                               status=form.cleaned_data['status'],
+                                               event=form.cleaned_data['event'],
+                                               start_date=form.cleaned_data['start_date'],
+                                               end_date=form.cleaned_data['end_date'],
+                                               assigned=form.cleaned_data['assigned'])
+
+                    folders_ids = form.cleaned_data['folders']
+
+                    for folder_id in folders_ids:
+                        service.populate_folder(user=user,
+                                                folder_id=folder_id,
+                                                task_id=task.id)
             except ValueError as e:
                 form.add_error('start_date', e)
                 return render(request, 'tasks/add.html', {'form': form})
 
-            folders_ids = form.cleaned_data['folders']
-
-            for folder_id in folders_ids:
-                service.populate_folder(user=user,
-                                        folder_id=folder_id,
-                                        task_id=task.id)
             return redirect('todoapp:show_task', task.id)
 
     else:
@@ -182,44 +209,45 @@ def edit_task(request, task_id):
         form = TaskForm(user, request.POST)
         if form.is_valid():
             try:
-                task = service.update_task(user=user,
-                                           task_id=task_id,
-                                           name=form.cleaned_data['name'],
-                                           description=form.cleaned_data['description'],
-                                           priority=form.cleaned_data['priority'],
-                                           status=form.cleaned_data['status'],
-                                           event=form.cleaned_data['event'],
-                                           start_date=form.cleaned_data['start_date'],
-                                           end_date=form.cleaned_data['end_date'])
+                with service.transaction():
+                    task = service.update_task(user=user,
+                                               task_id=task_id,
+                                               name=form.cleaned_data['name'],
+                                               description=form.cleaned_data['description'],
+                                               priority=form.cleaned_data['priority'],
+                                               status=form.cleaned_data['status'],
+                                               event=form.cleaned_data['event'],
+                                               start_date=form.cleaned_data['start_date'],
+                                               end_date=form.cleaned_data['end_date'])
+
+                    assigned = form.cleaned_data['assigned']
+
+                    if assigned:
+                        service.assign_user(user=user,
+                                            task_id=task.id,
+                                            user_receiver=assigned)
+
+                    current_folders = service.get_task_folders(task_id=task.id,
+                                                               user=user)
+
+                    old_folders = set(map(lambda folder: folder.id, current_folders))
+                    new_folders = set(form.cleaned_data['folders'])
+
+                    add = new_folders.difference(old_folders)
+                    remove = old_folders.difference(new_folders)
+
+                    for folder_id in add:
+                        service.populate_folder(user=user,
+                                                folder_id=folder_id,
+                                                task_id=task.id)
+                    for folder_id in remove:
+                        service.unpopulate_folder(user=user,
+                                                  folder_id=folder_id,
+                                                  task_id=task.id)
             except ValueError as e:
                 form.add_error('start_date', e)
                 return render(request, 'tasks/edit.html', {'form': form})
 
-            assigned = form.cleaned_data['assigned']
-
-            if assigned:
-                service.assign_user(user=user,
-                                    task_id=task.id,
-                                    user_receiver=assigned)
-
-            current_folders = service.get_task_folders(task_id=task.id,
-                                                       user=user)
-
-            old_folders = set(map(lambda folder: folder.id, current_folders))
-            new_folders = set(form.cleaned_data['folders'])
-
-            add = new_folders.difference(old_folders)
-            remove = old_folders.difference(new_folders)
-
-            for folder_id in add:
-                service.populate_folder(user=user,
-                                        folder_id=folder_id,
-                                        task_id=task.id)
-            for folder_id in remove:
-                service.unpopulate_folder(user=user,
-                                          folder_id=folder_id,
-                                          task_id=task.id)
-
             return redirect('todoapp:show_task', task.id)
 
     else:
@@ -336,10 +364,11 @@ def share_task(request, task_id):
             service = get_service()
             user = request.user.username
             task_id = int(task_id)
-            member = form.cleaned_data['member'].username
-            service.share_task(user=user,
-                               task_id=task_id,
-                               user_receiver=member)
+            members = [member.username
+                       for member in form.cleaned_data['members']]
+            service.share_tasks(user=user,
+                                task_ids=[task_id],
+                                receivers=members)
             return redirect('todoapp:show_task', task_id)
 
     else:
@@ -440,7 +469,8 @@ def search_tasks(request):
                                                assigned=form.cleaned_data['assigned'],
                                                status=form.cleaned_data['status'],
                                                priority=form.cleaned_data['priority'],
-                                               event=form.cleaned_data['event'])
+                                               event=form.cleaned_data['event'],
+                                               columns='list')
 
             return render(request, 'tasks/search_result.html',
                           {'header': 'Search result',
@@ -456,13 +486,18 @@ def search_tasks(request):
 def own_tasks(request):
     service = get_service()
     user = request.user.username
-    tasks = [task for task in service.get_filtered_tasks(user=user, owner=user)
-             if task.status != TaskStatus.ARCHIVED]
+    page = get_page(request, service.list_tasks,
+                    user=user,
+                    owner=user,
+                    task_filter=ACTIVE_TASKS,
+                    columns='list')
     folders = service.get_all_folders(user)
 
     return render(request, 'tasks/list.html',
-                  {'tasks': tasks, 'header': 'My tasks',
+                  {'tasks': page.items, 'header': 'My tasks',
                    'folders': folders,
+                   'next_cursor': page.cursor,
+                   'stats': get_stats(service, user),
                    'nav_active': 'own'})
 
 
@@ -471,13 +506,17 @@ def own_tasks(request):
 def available_tasks(request):
     service = get_service()
     user = request.user.username
-    tasks = [task for task in service.get_available_tasks(user=user)
-             if task.status != TaskStatus.ARCHIVED]
+    page = get_page(request, service.list_tasks,
+                    user=user,
+                    task_filter=ACTIVE_TASKS,
+                    columns='list')
     folders = service.get_all_folders(user)
 
     return render(request, 'tasks/list.html',
-                  {'tasks': tasks, 'header': 'Available tasks',
+                  {'tasks': page.items, 'header': 'Available tasks',
                    'folders': folders,
+                   'next_cursor': page.cursor,
+                   'stats': get_stats(service, user),
                    'nav_active': 'available'})
 
 
@@ -486,13 +525,18 @@ def available_tasks(request):
 def assigned_tasks(request):
     service = get_service()
     user = request.user.username
-    tasks = [task for task in service.get_user_assigned_tasks(user)
-             if task.status != TaskStatus.ARCHIVED]
+    page = get_page(request, service.list_tasks,
+                    user=user,
+                    assigned=user,
+                    task_filter=ACTIVE_TASKS,
+                    columns='list')
     folders = service.get_all_folders(user)
 
     return render(request, 'tasks/list.html',
-                  {'tasks': tasks, 'header': 'Assigned tasks',
+                  {'tasks': page.items, 'header': 'Assigned tasks',
                    'folders': folders,
+                   'next_cursor': page.cursor,
+                   'stats': get_stats(service, user),
                    'nav_active': 'assigned'})
 
 
@@ -501,13 +545,17 @@ def assigned_tasks(request):
 def archived_tasks(request):
     service = get_service()
     user = request.user.username
-    tasks = service.get_filtered_tasks(user=user,
-                                       status=TaskStatus.ARCHIVED)
+    page = get_page(request, service.list_tasks,
+                    user=user,
+                    status=TaskStatus.ARCHIVED,
+                    columns='list')
     folders = service.get_all_folders(user)
 
     return render(request, 'tasks/list.html',
-                  {'tasks': tasks, 'header': 'Archived tasks',
+                  {'tasks': page.items, 'header': 'Archived tasks',
                    'folders': folders,
+                   'next_cursor': page.cursor,
+                   'stats': get_stats(service, user),
                    'nav_active': 'archived'})
 
 
@@ -516,14 +564,18 @@ def archived_tasks(request):
 def done_tasks(request):
     service = get_service()
     user = request.user.username
-    tasks = service.get_filtered_tasks(user=user,
-                                       status=TaskStatus.DONE)
+    page = get_page(request, service.list_tasks,
+                    user=user,
+                    status=TaskStatus.DONE,
+                    columns='list')
     folders = service.get_all_folders(user)
 
     return render(request, 'tasks/list.html',
-                  {'tasks': tasks,
+                  {'tasks': page.items,
                    'header': 'Done tasks',
                    'folders': folders,
+                   'next_cursor': page.cursor,
+                   'stats': get_stats(service, user),
                    'nav_active': 'done'})
 
 
@@ -537,14 +589,17 @@ def folder_tasks(request, folder_id):
     folder = service.get_folder(user=user,
                                 folder_id=folder_id)
     folders = service.get_all_folders(user=user)
-
-    tasks = [task for task in folder.tasks
-             if task.status != TaskStatus.ARCHIVED]
+    page = get_page(request, service.list_tasks,
+                    user=user,
+                    task_filter=ACTIVE_TASKS & TaskFilter(folder=folder.id),
+                    columns='list')
 
     return render(request, 'tasks/list.html',
-                  {'tasks': tasks,
+                  {'tasks': page.items,
                    'header': f'{folder.name} tasks',
                    'folders': folders,
+                   'next_cursor': page.cursor,
+                   'stats': get_stats(service, user),
                    'nav_active': folder.id})
 
 
@@ -553,10 +608,12 @@ def folder_tasks(request, folder_id):
 def plans(request):
     service = get_service()
     user = request.user.username
-    plans = service.get_all_plans(user=user)
+    page = get_page(request, service.list_plans, user=user,
+                    columns='list')
 
     return render(request, 'plans/list.html',
-                  {'plans': plans,
+                  {'plans': page.items,
+                   'next_cursor': page.cursor,
                    'header': 'Available plans'})
 
 
@@ -750,8 +807,10 @@ def delete_reminder(request, reminder_id):
 def reminders(request):
     service = get_service()
     user = request.user.username
-    reminders = service.get_all_reminders(user=user)
+    page = get_page(request, service.list_reminders, user=user,
+                    columns='list')
 
     return render(request, 'reminders/list.html',
-                  {'reminders': reminders,
+                  {'reminders': page.items,
+                   'next_cursor': page.cursor,
                    'header': 'Available reminders'})
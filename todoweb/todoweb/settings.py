@@ -50,6 +50,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'todoapp.middleware.LibSessionMiddleware',
 ]
 
 ROOT_URLCONF = 'todoweb.urls'
@@ -84,6 +85,31 @@ DATABASES = {
     }
 }
 
+# todolib engine is built once per process and shared by requests
+TODOLIB_ENGINE_OPTIONS = {
+    'pool_size': 5,
+    'max_overflow': 10,
+    'pool_recycle': 3600,
+    # key of todolib.models.SQLITE_PRAGMA_PROFILES
+    'pragma_profile': 'wal',
+    # count statements per view and library call, report N+1 queries
+    'track_queries': DEBUG,
+}
+# request scoped sessions keep loaded objects state after commit
+TODOLIB_EXPIRE_ON_COMMIT = False
+# amount of items on list pages
+TODOLIB_PAGE_SIZE = 50
+
+# todolib records are written by background thread, not request thread
+TODOLIB_LOGGING = {
+    'log_file_path': os.path.join(BASE_DIR, 'todolib.log'),
+    'log_level': 'INFO',
+    'async_logging': True,
+    'rotate_when': 'midnight',
+    'backup_count': 7,
+    'compress': True,
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/1.11/ref/settings/#auth-password-validators